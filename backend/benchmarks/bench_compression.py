@@ -0,0 +1,64 @@
+"""
+Benchmark: extractive prompt compression at several token budgets.
+
+Usage (from backend/):
+    python benchmarks/bench_compression.py
+    python benchmarks/bench_compression.py --budgets 500 1000 2000 path/to/saved_page.html
+
+For each budget prints the compression ratio, time spent, how many sections
+kept at least one sentence, and term recall: the share of the article's
+distinctive terms (words in 2+ sentences) that survive. Use it to pick
+PROMPT_TOKEN_BUDGET before comparing quiz quality by hand.
+"""
+import argparse
+import glob
+import os
+import re
+import statistics
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractor import extract_article
+from compressor import compress_sections, split_sentences, STOPWORDS, WORD
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def key_terms(section_texts):
+    df = Counter()
+    for section in section_texts:
+        for paragraph in section["paragraphs"]:
+            for sentence in split_sentences(paragraph):
+                df.update({w for w in WORD.findall(sentence.lower()) if w not in STOPWORDS and len(w) > 2})
+    return {w for w, n in df.items() if n >= 2}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixtures", nargs="*", help="Saved Wikipedia HTML files (defaults to benchmarks/fixtures)")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[500, 1000, 1500, 2500])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    paths = args.fixtures or sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html")))
+    for path in paths:
+        with open(path, "rb") as f:
+            # Every section, whatever SCRAPER_SECTION_TEXT_BUDGET says
+            page = extract_article(f.read(), section_budget=10 ** 9)
+        sections = [s for s in page.section_texts if s["paragraphs"]]
+        terms = key_terms(sections)
+        print(f"\n{os.path.basename(path)} ({len(sections)} sections, {len(terms)} key terms)")
+
+        for budget in args.budgets:
+            times = []
+            for _ in range(args.runs):
+                text, report = compress_sections(sections, budget)
+                times.append(report["seconds"] * 1000)
+            kept_terms = set(WORD.findall(text.lower())) & terms
+            covered = sum(1 for s in sections if re.search(r"^" + re.escape(s["title"]) + r"$", text, re.M))
+            print(f"  budget {budget:>5}: {report['original_tokens']:>6} -> {report['compressed_tokens']:>5} tokens "
+                  f"(x{report['ratio']:<5}) median {statistics.median(times):6.2f} ms   "
+                  f"sections {covered}/{len(sections)}   term recall {len(kept_terms) / max(len(terms), 1):.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark: gazetteer entity extraction on large articles.
+
+Usage (from backend/):
+    python benchmarks/bench_entities.py
+    python benchmarks/bench_entities.py --names 2000000 --scale 50 --runs 10
+    python benchmarks/bench_entities.py --gazetteer data/gazetteer.tsv
+
+Builds a synthetic gazetteer of --names entries (the bundled names plus
+generated two- and three-word names) unless --gazetteer is given, then
+reports compile time, load time from the compiled cache and memory, and
+times extraction over every fixture's whole article text repeated --scale
+times. The baseline is the obvious alternative, a substring test per name,
+timed on a sample of names and scaled to the full gazetteer.
+"""
+import argparse
+import glob
+import os
+import random
+import re
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from entities import Gazetteer, read_gazetteer, ENTITY_KINDS, GAZETTEER_PATH
+from extractor import extract_article
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+CAPITALIZED = re.compile(r"\b[A-Z][a-z]{2,}\b")
+BASELINE_SAMPLE = 2000
+
+def article_texts(scale):
+    texts = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html"))):
+        with open(path, "rb") as f:
+            page = extract_article(f.read(), text_budget=10 ** 9, section_budget=10 ** 9)
+        text = "\n\n".join(p for section in page.section_texts for p in [section["title"], *section["paragraphs"]])
+        texts.append((os.path.basename(path), "\n\n".join([text] * scale)))
+    return texts
+
+def synthetic_gazetteer(path, size, texts, rng):
+    """
+    Writes a gazetteer of the bundled names plus generated ones built from
+    capitalized words of the fixtures, so some of them really occur.
+    """
+    _, rows = read_gazetteer(GAZETTEER_PATH)
+    rows = list(rows)
+    words = sorted({w for _, text in texts for w in CAPITALIZED.findall(text)})
+    names = {name for name, _, _ in rows}
+    while len(names) < size:
+        name = " ".join(rng.choice(words) for _ in range(rng.choice((2, 2, 3))))
+        if name not in names:
+            names.add(name)
+            rows.append((name, rng.choice(ENTITY_KINDS), name))
+    rows.sort()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# version: bench\n")
+        for row in rows:
+            f.write("\t".join(row) + "\n")
+    return [name for name, _, _ in rows]
+
+def maxrss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--names", type=int, default=500000, help="Synthetic gazetteer size")
+    parser.add_argument("--gazetteer", help="Use this gazetteer file instead of a synthetic one")
+    parser.add_argument("--scale", type=int, default=20, help="Repeat each article's text this many times")
+    parser.add_argument("--runs", type=int, default=10, help="Timed extractions per article")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    texts = article_texts(args.scale)
+    workdir = tempfile.mkdtemp(prefix="bench-entities-")
+    path = args.gazetteer
+    if path:
+        _, rows = read_gazetteer(path)
+        names = [name for name, _, _ in rows]
+    else:
+        path = os.path.join(workdir, "gazetteer.tsv")
+        names = synthetic_gazetteer(path, args.names, texts, rng)
+
+    rss_before = maxrss_mb()
+    built = Gazetteer.load(path, workdir)
+    rss_after = maxrss_mb()
+    cached = Gazetteer.load(path, workdir)
+    cache_mb = sum(os.path.getsize(f) for f in glob.glob(os.path.join(workdir, "gazetteer-*"))) / 1e6
+    print(f"{len(names)} names: compiled in {built.load_seconds:.2f}s, loaded from cache in {cached.load_seconds:.3f}s, "
+          f"cache {cache_mb:.1f} MB on disk, peak RSS +{rss_after - rss_before:.0f} MB while compiling")
+
+    sample = rng.sample(names, min(BASELINE_SAMPLE, len(names)))
+    for name, text in texts:
+        timings = []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            # No per-kind limit, so the whole text is scanned
+            found = cached.extract(text, limit=len(names))
+            timings.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        for entity in sample:
+            entity in text
+        naive = (time.perf_counter() - t0) * len(names) / len(sample)
+        median = statistics.median(timings)
+        print(f"{name:<36} {len(text) / 1e6:>6.2f} MB   automaton {median * 1000:>8.2f} ms "
+              f"({len(text) / 1e6 / median:>6.1f} MB/s)   per-name scan ~{naive:>8.2f} s   "
+              f"entities {sum(len(v) for v in found.values())}")
+
+if __name__ == "__main__":
+    main()
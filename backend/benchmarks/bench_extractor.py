@@ -0,0 +1,122 @@
+"""
+Benchmark: single-pass extractor vs. the original BeautifulSoup scraper.
+
+Usage (from backend/):
+    python benchmarks/bench_extractor.py
+    python benchmarks/bench_extractor.py --scale 8 --runs 20
+    python benchmarks/bench_extractor.py path/to/saved_page.html
+
+--scale repeats each fixture's article body N times to approximate long
+articles (real Wikipedia pages are often 300 KB - 1 MB of HTML).
+"""
+import argparse
+import glob
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+import extractor
+from extractor import extract_article
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def legacy_parse(content):
+    """
+    The original scrape_wikipedia parsing logic, kept verbatim as the baseline.
+    """
+    soup = BeautifulSoup(content, 'html.parser')
+    title = soup.find('h1', id='firstHeading').text.strip()
+    content_div = soup.find('div', id='mw-content-text').find('div', class_='mw-parser-output')
+
+    summary = ""
+    paragraphs = content_div.find_all('p', recursive=False)
+    for p in paragraphs:
+        if p.text.strip():
+            summary = p.text.strip()
+            summary = re.sub(r'\[\d+\]', '', summary)
+            break
+
+    sections = []
+    headers = content_div.find_all(['h2', 'h3'], recursive=False)
+    for header in headers:
+        text = header.find('span', class_='mw-headline')
+        if text:
+            sections.append(text.text.strip())
+
+    full_text = ""
+    for element in content_div.find_all(['p', 'h2', 'h3'], recursive=False):
+        text = element.text.strip()
+        text = re.sub(r'\[\d+\]', '', text)
+        if text:
+            full_text += text + "\n\n"
+
+    entities = {"people": [], "organizations": [], "locations": []}
+    links = content_div.find_all('a', href=re.compile(r'^/wiki/'), limit=15)
+    for link in links:
+        entity_name = link.text.strip()
+        if entity_name and entity_name not in entities["people"] and not entity_name.startswith('['):
+            entities["people"].append(entity_name)
+
+    return title, summary, sections, full_text[:10000], entities
+
+def scale_page(html, factor):
+    """
+    Repeats the article body (first heading up to References) `factor` times.
+    """
+    if factor <= 1:
+        return html
+    first = re.search(r'<h2><span class="mw-headline"|<div class="mw-heading', html)
+    refs = html.find('id="References"')
+    if not first or refs == -1:
+        return html
+    # Step back over the heading tag and its wrapper (<h2> or div.mw-heading)
+    refs = html.rfind('<', 0, html.rfind('<', 0, refs))
+    body = html[first.start():refs]
+    return html[:refs] + body * (factor - 1) + html[refs:]
+
+def time_it(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), min(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixtures", nargs="*", help="Saved Wikipedia HTML files (defaults to benchmarks/fixtures)")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--scale", type=int, default=1)
+    args = parser.parse_args()
+
+    paths = args.fixtures or sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html")))
+    variants = [("legacy bs4/html.parser", lambda c: legacy_parse(c))]
+    variants.append(("single-pass html.parser", lambda c: extract_article(c, backend="html.parser")))
+    if extractor.etree is not None:
+        variants.append(("single-pass lxml", lambda c: extract_article(c, backend="lxml")))
+
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            html = scale_page(f.read(), args.scale)
+        content = html.encode("utf-8")
+        print(f"\n{os.path.basename(path)} ({len(content) / 1024:.0f} KB, scale x{args.scale}, {args.runs} runs)")
+
+        baseline = None
+        for name, fn in variants:
+            median, best = time_it(lambda: fn(content), args.runs)
+            baseline = baseline or median
+            print(f"  {name:<26} median {median:8.2f} ms   min {best:8.2f} ms   speedup x{baseline / median:5.1f}")
+
+        # Sanity check: the new engine agrees with the baseline on the summary
+        legacy_summary = legacy_parse(content)[1]
+        page = extract_article(content)
+        status = "ok" if page.summary == legacy_summary.strip() else "DIFFERS"
+        print(f"  summary parity: {status}; sections: legacy {len(legacy_parse(content)[2])}, single-pass {len(page.sections)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Load test: drives the API at fixed concurrency levels, fully offline.
+
+Usage (from backend/):
+    python benchmarks/bench_load.py
+    python benchmarks/bench_load.py --concurrency 1 8 32 --requests 64 --llm-latency 0.5
+    python benchmarks/bench_load.py --compare benchmarks/results/load-<commit>.json
+
+By default the app runs in-process (httpx ASGI transport) against a fresh
+SQLite database, with LLM_PROVIDER=fake and SCRAPER_PROVIDER=fixtures, so no
+API key or network is needed. --upstream sends scrapes over HTTP to a running
+benchmarks/fixture_server.py instead. --base-url targets an already running
+server (start it with LLM_PROVIDER=fake and the scraper settings you want).
+
+Scenarios, each run at every concurrency level with fresh article titles:
+    preview          GET  /preview-article (uncached scrape + parse)
+    generate-cold    POST /generate-quiz for new articles (scrape + LLM + insert)
+    generate-cached  POST /generate-quiz for articles that already have a quiz
+    quiz             GET  /quiz/{id}
+    variant          GET  /quiz/{id}/variant (question bank, no LLM call)
+
+Reports throughput and p50/p95/p99 latency per scenario and level, and
+writes them as JSON (with the git commit) so runs can be compared.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx
+
+SCENARIOS = ["preview", "generate-cold", "generate-cached", "quiz", "variant"]
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+def percentile(sorted_values, p):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+def summarize(scenario, concurrency, latencies, errors, elapsed):
+    ok = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": ms(percentile(ok, 50)),
+        "p95_ms": ms(percentile(ok, 95)),
+        "p99_ms": ms(percentile(ok, 99)),
+        "mean_ms": ms(sum(ok) / len(ok)) if ok else 0.0,
+        "max_ms": ms(ok[-1]) if ok else 0.0,
+    }
+
+async def run_level(client, scenario, concurrency, calls):
+    """
+    Runs the request coroutines in `calls` with at most `concurrency` in
+    flight. Returns (summary, responses) with None for failed requests.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(call):
+        async with slots:
+            t0 = time.perf_counter()
+            try:
+                response = await call(client)
+                response.raise_for_status()
+            except Exception as e:
+                print(f"  {scenario}: request failed: {e}")
+                return None
+            latencies.append(time.perf_counter() - t0)
+            return response
+
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(one(call) for call in calls))
+    elapsed = time.perf_counter() - started
+    errors = sum(1 for r in responses if r is None)
+    return summarize(scenario, concurrency, latencies, errors, elapsed), responses
+
+def article_url(run_id, name):
+    return f"https://en.wikipedia.org/wiki/Bench_{run_id}_{name}"
+
+async def run_benchmark(client, args):
+    run_id = uuid.uuid4().hex[:8]
+    results = []
+
+    def report(summary):
+        results.append(summary)
+        print(f"{summary['scenario']:>16} c={summary['concurrency']:<4} {summary['throughput_rps']:>9.2f} req/s   "
+              f"p50 {summary['p50_ms']:>9.2f}   p95 {summary['p95_ms']:>9.2f}   p99 {summary['p99_ms']:>9.2f} ms"
+              f"   errors {summary['errors']}")
+
+    for concurrency in args.concurrency:
+        n = args.requests
+        if "preview" in args.scenarios:
+            urls = [article_url(run_id, f"preview_{concurrency}_{i}") for i in range(n)]
+            summary, _ = await run_level(client, "preview", concurrency, [
+                (lambda c, u=u: c.get("/preview-article", params={"url": u})) for u in urls
+            ])
+            report(summary)
+
+        # Cold generation also seeds the articles the cached and /quiz scenarios read
+        urls = [article_url(run_id, f"quiz_{concurrency}_{i}") for i in range(n)]
+        calls = [(lambda c, u=u: c.post("/generate-quiz", params={"url": u})) for u in urls]
+        summary, responses = await run_level(client, "generate-cold", concurrency, calls)
+        if "generate-cold" in args.scenarios:
+            report(summary)
+        ids = [r.json()["id"] for r in responses if r is not None]
+
+        if "generate-cached" in args.scenarios:
+            summary, _ = await run_level(client, "generate-cached", concurrency, calls)
+            report(summary)
+        if "quiz" in args.scenarios and ids:
+            summary, _ = await run_level(client, "quiz", concurrency, [
+                (lambda c, i=ids[k % len(ids)]: c.get(f"/quiz/{i}")) for k in range(n)
+            ])
+            report(summary)
+        if "variant" in args.scenarios and ids:
+            summary, _ = await run_level(client, "variant", concurrency, [
+                (lambda c, i=ids[k % len(ids)]: c.get(f"/quiz/{i}/variant", params={"size": 5})) for k in range(n)
+            ])
+            report(summary)
+    return results
+
+def configure_in_process(args):
+    """
+    Environment for the in-process app; must run before main is imported.
+    """
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-load-"), "bench.db")
+    os.environ.update({
+        "DATABASE_URL": database_url,
+        "LLM_PROVIDER": "fake",
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        # The quota limiter is not what is being measured
+        "LLM_REQUESTS_PER_MINUTE": "1000000",
+        "LLM_BURST": "100000",
+    })
+    if args.upstream:
+        os.environ.update({"SCRAPER_PROVIDER": "http", "SCRAPER_UPSTREAM": args.upstream})
+    else:
+        os.environ.update({"SCRAPER_PROVIDER": "fixtures", "SCRAPER_FIXTURE_LATENCY": str(args.fixture_latency)})
+    return database_url
+
+async def run(args):
+    timeout = httpx.Timeout(args.timeout)
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout) as client:
+            return await run_benchmark(client, args)
+
+    import main
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+            return await run_benchmark(client, args)
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path}:")
+    for r in results:
+        old = baseline.get((r["scenario"], r["concurrency"]))
+        if not old:
+            continue
+        change = lambda key: (r[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        print(f"{r['scenario']:>16} c={r['concurrency']:<4} throughput {change('throughput_rps'):+7.1f}%   "
+              f"p50 {change('p50_ms'):+7.1f}%   p95 {change('p95_ms'):+7.1f}%   p99 {change('p99_ms'):+7.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=64, help="Requests per scenario and concurrency level")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Fake LLM seconds per call (in-process)")
+    parser.add_argument("--fixture-latency", type=float, default=0.0, help="Seconds per fixture fetch (in-process)")
+    parser.add_argument("--upstream", help="Scrape over HTTP from this fixture server instead of in-process fixtures")
+    parser.add_argument("--database-url", help="Database for the in-process app (default: a fresh SQLite file)")
+    parser.add_argument("--base-url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/load-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to print relative changes against")
+    args = parser.parse_args()
+
+    database_url = None if args.base_url else configure_in_process(args)
+    results = asyncio.run(run(args))
+
+    commit = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "settings": {
+                "target": args.base_url or "in-process",
+                "database_url": database_url,
+                "scraper": args.upstream or ("external" if args.base_url else "fixtures"),
+                "llm_latency": None if args.base_url else args.llm_latency,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+            },
+            "results": results,
+        }, f, indent=2)
+    print(f"\nResults written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
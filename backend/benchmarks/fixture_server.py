@@ -0,0 +1,88 @@
+"""
+Local HTML-fixture server standing in for Wikipedia.
+
+Usage (from backend/):
+    python benchmarks/fixture_server.py --port 8765 --latency 0.05
+
+Serves /wiki/<Title> from the saved pages in benchmarks/fixtures (or
+SCRAPER_FIXTURE_DIR): a page whose file name matches the title as is, any
+other title as a hash-picked fixture renamed to that title, so load tests can
+request as many distinct articles as they like. Answers If-None-Match with
+304, and MediaWiki revisions queries on /w/api.php with each fixture's
+revision id. Point the app at it with:
+    SCRAPER_UPSTREAM=http://127.0.0.1:8765 uvicorn main:app
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fixtures import fixture_page, fixture_etag, fixture_revisions, title_from_url
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.path.startswith("/w/api.php"):
+            return self.revisions()
+        page = fixture_page(title_from_url(self.path)) if self.path.startswith("/wiki/") else None
+        if page is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = fixture_etag(page)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=UTF-8")
+        self.send_header("Content-Length", str(len(page)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(page)
+
+    def revisions(self):
+        query = parse_qs(urlsplit(self.path).query)
+        titles = query.get("titles", [""])[0].split("|")
+        body = json.dumps(fixture_revisions([t.replace("_", " ") for t in titles if t])).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    FixtureHandler.latency = args.latency
+    server = ThreadingHTTPServer((args.host, args.port), FixtureHandler)
+    server.verbose = args.verbose
+    print(f"Serving fixtures on http://{args.host}:{args.port}/wiki/<Title>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
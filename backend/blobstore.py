@@ -0,0 +1,166 @@
+import ast
+import asyncio
+import logging
+import os
+import xxhash
+import zstandard
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal, WikiArticle, HtmlBlob, init_db
+from observability import setup_logging, span
+
+# Level 9 is a good size/speed trade-off for page HTML (a few ms per page)
+ZSTD_LEVEL = int(os.getenv("HTML_ZSTD_LEVEL", "9"))
+MIGRATION_BATCH_SIZE = int(os.getenv("HTML_MIGRATION_BATCH_SIZE", "200"))
+
+log = logging.getLogger(__name__)
+
+def html_hash(content):
+    return xxhash.xxh3_128_hexdigest(content)
+
+def compress_html(content):
+    # Compressor objects are not thread-safe, so use one per call
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(content)
+
+def put_html(db, content):
+    """
+    Stores page HTML (bytes) compressed and returns its content hash.
+    Content already in the store is not written again.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    key = html_hash(content)
+    if db.query(HtmlBlob.hash).filter(HtmlBlob.hash == key).first():
+        return key
+    data = compress_html(content)
+    try:
+        db.add(HtmlBlob(hash=key, data=data, size=len(content), compressed_size=len(data)))
+        db.commit()
+    except IntegrityError:
+        # Stored concurrently by another worker
+        db.rollback()
+    return key
+
+async def put_html_async(db, content):
+    """
+    put_html for an AsyncSession, as part of the caller's transaction: the
+    blob is flushed inside a savepoint and the caller commits, like
+    put_html_many. Compression runs in a worker thread. (On SQLite a
+    savepoint opened before any other write commits on release; at worst
+    that leaves an unreferenced blob.)
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    key = html_hash(content)
+    if (await db.execute(select(HtmlBlob.hash).where(HtmlBlob.hash == key))).first():
+        return key
+    data = await asyncio.to_thread(compress_html, content)
+    try:
+        with span("db_commit", "put_html"):
+            async with db.begin_nested():
+                db.add(HtmlBlob(hash=key, data=data, size=len(content), compressed_size=len(data)))
+    except IntegrityError:
+        # Stored concurrently by another worker; only the savepoint is rolled back
+        pass
+    return key
+
+async def put_html_many(db, contents):
+    """
+    Batch form of put_html_async for bulk loads: one lookup for the whole
+    batch, and new blobs are only added to the session (the caller commits).
+    Returns the content hashes in input order.
+    """
+    contents = [c.encode("utf-8") if isinstance(c, str) else c for c in contents]
+    keys = [html_hash(c) for c in contents]
+    existing = set((await db.execute(select(HtmlBlob.hash).where(HtmlBlob.hash.in_(set(keys))))).scalars())
+    fresh = {}
+    for key, content in zip(keys, contents):
+        if key not in existing:
+            fresh.setdefault(key, content)
+    compressed = await asyncio.to_thread(lambda: [compress_html(c) for c in fresh.values()])
+    for (key, content), data in zip(fresh.items(), compressed):
+        db.add(HtmlBlob(hash=key, data=data, size=len(content), compressed_size=len(data)))
+    return keys
+
+async def get_html(db, key):
+    """
+    Returns the decompressed HTML bytes for key, or None.
+    """
+    data = (await db.execute(select(HtmlBlob.data).where(HtmlBlob.hash == key))).scalar()
+    if data is None:
+        return None
+    return await asyncio.to_thread(zstandard.ZstdDecompressor().decompress, data)
+
+def legacy_html_bytes(value):
+    """
+    Recovers page bytes from the old raw_html column, which held
+    str(response.content), i.e. a bytes repr such as "b'<!DOCTYPE ...'".
+    """
+    if value.startswith(("b'", 'b"')):
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass
+    return value.encode("utf-8")
+
+async def get_article_html(db, article):
+    """
+    Raw HTML for an article, from the blob store or a not-yet-migrated row.
+    """
+    if article.raw_html_hash:
+        return await get_html(db, article.raw_html_hash)
+    # Deferred column, loaded only here
+    legacy = (await db.execute(select(WikiArticle.raw_html).where(WikiArticle.id == article.id))).scalar()
+    return legacy_html_bytes(legacy) if legacy else None
+
+def migrate_raw_html(batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Moves legacy raw_html values into the blob store in id order, clearing
+    the old column as it goes. Safe to interrupt and re-run.
+    """
+    db = SessionLocal()
+    migrated = 0
+    last_id = 0
+    try:
+        while True:
+            rows = db.query(WikiArticle.id, WikiArticle.raw_html).filter(
+                WikiArticle.id > last_id,
+                WikiArticle.raw_html.isnot(None),
+                WikiArticle.raw_html_hash.is_(None)
+            ).order_by(WikiArticle.id).limit(batch_size).all()
+            if not rows:
+                break
+            for article_id, raw_html in rows:
+                key = put_html(db, legacy_html_bytes(raw_html))
+                db.query(WikiArticle).filter(WikiArticle.id == article_id).update(
+                    {"raw_html_hash": key, "raw_html": None}, synchronize_session=False)
+                db.commit()
+                last_id = article_id
+            migrated += len(rows)
+            log.info("Migrated raw HTML for %d articles...", migrated)
+    finally:
+        db.close()
+    return migrated
+
+def blob_stats(db):
+    count, size, compressed = db.query(
+        func.count(HtmlBlob.hash), func.sum(HtmlBlob.size), func.sum(HtmlBlob.compressed_size)
+    ).one()
+    return {
+        "blobs": count,
+        "bytes": size or 0,
+        "compressed_bytes": compressed or 0,
+        "ratio": round(size / compressed, 2) if compressed else 0.0,
+    }
+
+if __name__ == "__main__":
+    # Migrate an existing database: python blobstore.py
+    setup_logging()
+    init_db()
+    print(f"Migrated {migrate_raw_html()} articles.")
+    print("Run VACUUM (SQLite/PostgreSQL) to return the freed space to the OS.")
+    db = SessionLocal()
+    try:
+        print(blob_stats(db))
+    finally:
+        db.close()
@@ -0,0 +1,201 @@
+"""
+Build the entity gazetteer from an offline MediaWiki XML dump.
+
+Usage (from backend/):
+    python build_gazetteer.py enwiki-latest-pages-articles.xml.bz2
+    python build_gazetteer.py dump.xml.zst --output data/gazetteer.tsv --min-anchor-count 5
+    python build_gazetteer.py dump.xml.bz2 --limit 100000 --version 2026.10-test
+
+Two streaming passes over the dump. The first classifies pages as people,
+organizations or locations from their infobox (falling back to categories
+such as "1912 births"). The second counts the links pointing at those pages:
+inbound links settle which page a shared name means, and link anchors used
+at least --min-anchor-count times for one page (e.g. [[Alan Turing|Turing]])
+become extra names for it. The result is written as a sorted, versioned TSV
+that entities.py compiles into its automaton; commit it alongside the code.
+Memory grows with the number of classified pages and distinct anchors, not
+with the dump size.
+"""
+import argparse
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from entities import ENTITY_KINDS, GAZETTEER_PATH
+from observability import setup_logging
+from wikidump import open_dump, iter_pages, COMMENT
+
+INFOBOX = re.compile(r"\{\{\s*Infobox[ _]+([^|}<\n]+)", re.I)
+CATEGORY = re.compile(r"\[\[\s*Category\s*:\s*([^|\]]+)", re.I)
+WIKILINK = re.compile(r"\[\[([^\[\]|#\n]+)(?:#[^\[\]|\n]*)?(?:\|([^\[\]|\n]+))?\]\]")
+PARENTHETICAL = re.compile(r"\s*\([^)]*\)$")
+
+# Infobox names (lowercased, without "Infobox ") by kind; a name not listed
+# is matched on its last word through INFOBOX_SUFFIXES
+INFOBOX_KINDS = {
+    "people": {
+        "person", "officeholder", "scientist", "writer", "artist", "philosopher", "royalty", "military person",
+        "sportsperson", "actor", "politician", "monarch", "saint", "pope", "cricketer", "chess player",
+        "mathematician", "engineer", "economist", "architect", "astronaut", "boxer", "comedian", "criminal",
+        "racing driver", "noble", "pharaoh", "theologian", "classical composer", "model", "journalist",
+        "christian leader", "clergy", "spy", "chef", "judge", "president", "prime minister", "governor",
+        "senator", "member of parliament", "academic", "medical person", "youtube personality", "dancer",
+        "fashion designer", "poker player", "professional wrestler", "martial artist", "comics creator",
+    },
+    "organizations": {
+        "company", "organization", "organisation", "university", "college", "school", "school district",
+        "political party", "government agency", "military unit", "sports team", "football club", "sports league",
+        "newspaper", "magazine", "airline", "bank", "brand", "non-profit", "nonprofit", "union", "trade union",
+        "legislature", "court", "laboratory", "institute", "research institute", "religious organization",
+        "broadcasting network", "television channel", "tv channel", "radio station", "record label",
+        "law enforcement agency", "intergovernmental organization", "ngo", "think tank", "fraternity",
+        "museum", "library", "hospital", "publisher", "government", "parliament", "sports federation",
+    },
+    "locations": {
+        "settlement", "country", "former country", "city", "town", "village", "province", "state", "region",
+        "river", "mountain", "mountain range", "lake", "island", "islands", "body of water", "protected area",
+        "park", "building", "historic site", "nrhp", "stadium", "venue", "airport", "bridge", "castle", "street",
+        "road", "uk place", "german location", "french commune", "italian comune", "indian jurisdiction",
+        "australian place", "u.s. state", "us county", "u.s. county", "district", "county", "municipality",
+        "neighbourhood", "neighborhood", "valley", "desert", "forest", "glacier", "volcano", "canal",
+        "country subdivision", "continent", "ocean", "sea", "bay", "cemetery", "prefecture", "landform",
+    },
+}
+INFOBOX_SUFFIXES = {
+    "people": ("biography", "person", "player", "athlete", "politician", "officeholder"),
+    "organizations": ("company", "club", "team", "agency", "party", "university", "school", "organization",
+                      "organisation", "institute", "league"),
+    "locations": ("place", "location", "settlement", "station", "county", "district", "municipality", "commune"),
+}
+CATEGORY_KINDS = (
+    ("people", re.compile(r"^(\d{1,4}s?( BC)? (births|deaths)|Living people)$")),
+    ("organizations", re.compile(r"\b(companies|organizations|organisations|universities|political parties)\b", re.I)),
+    ("locations", re.compile(r"^(Populated places|Cities|Towns|Villages|Countries|Capitals|Rivers|Mountains|Islands)\b")),
+)
+
+def _infobox_kind(name):
+    name = " ".join(name.lower().replace("_", " ").split())
+    for kind, names in INFOBOX_KINDS.items():
+        if name in names:
+            return kind
+    for kind, suffixes in INFOBOX_SUFFIXES.items():
+        if name.endswith(suffixes):
+            return kind
+    return None
+
+def classify(wikitext):
+    """
+    The entity kind of a page from its first recognised infobox, else from
+    its categories, or None.
+    """
+    for m in INFOBOX.finditer(wikitext):
+        kind = _infobox_kind(m.group(1))
+        if kind:
+            return kind
+    for m in CATEGORY.finditer(wikitext):
+        category = m.group(1).strip()
+        for kind, pattern in CATEGORY_KINDS:
+            if pattern.search(category):
+                return kind
+    return None
+
+def normalize_title(target):
+    target = " ".join(target.replace("_", " ").split())
+    return target[:1].upper() + target[1:]
+
+def usable_name(name):
+    """
+    Names worth matching: at least 3 characters, with a capital letter
+    (lowercase anchors are mostly common words), and not just digits.
+    """
+    return 3 <= len(name) <= 200 and any(c.isupper() for c in name) and not name.replace(" ", "").isdigit()
+
+def classify_pages(path, limit=None):
+    kinds = {}
+    with open_dump(path) as stream:
+        for n, (_, title, wikitext, _) in enumerate(iter_pages(stream)):
+            if limit is not None and n >= limit:
+                break
+            kind = classify(wikitext)
+            if kind:
+                kinds[title] = kind
+    return kinds
+
+def count_links(path, kinds, limit=None):
+    """
+    (inbound link count per classified title, Counter of (anchor, title))
+    over every link to a classified page.
+    """
+    inbound = Counter()
+    anchors = Counter()
+    with open_dump(path) as stream:
+        for n, (_, _, wikitext, _) in enumerate(iter_pages(stream)):
+            if limit is not None and n >= limit:
+                break
+            for m in WIKILINK.finditer(COMMENT.sub("", wikitext)):
+                title = normalize_title(m.group(1))
+                if title not in kinds:
+                    continue
+                inbound[title] += 1
+                anchor = " ".join((m.group(2) or "").split())
+                if anchor and anchor != title and usable_name(anchor):
+                    anchors[(anchor, title)] += 1
+    return inbound, anchors
+
+def gazetteer_rows(kinds, inbound, anchors, min_anchor_count=3):
+    """
+    Sorted (name, kind, title) rows. Each title is listed under its name
+    without any "(disambiguation)" suffix; a name shared by several titles
+    goes to the most linked one. Anchors become names only where no title
+    claims them and one title has at least half of their uses.
+    """
+    candidates = defaultdict(list)
+    for title in kinds:
+        name = PARENTHETICAL.sub("", title)
+        if usable_name(name):
+            candidates[name].append(title)
+    names = {name: max(titles, key=lambda t: (t == name, inbound[t])) for name, titles in candidates.items()}
+
+    by_anchor = defaultdict(list)
+    for (anchor, title), count in anchors.items():
+        by_anchor[anchor].append((count, title))
+    for anchor, uses in by_anchor.items():
+        if anchor in names:
+            continue
+        count, title = max(uses)
+        if count >= min_anchor_count and count * 2 >= sum(c for c, _ in uses):
+            names[anchor] = title
+    return sorted((name, kinds[title], title) for name, title in names.items())
+
+def write_gazetteer(path, rows, version, source):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(f"# wikiquiz gazetteer\n# version: {version}\n# source: {source}\n# name\tkind\ttitle\n")
+        for row in rows:
+            f.write("\t".join(row) + "\n")
+    os.replace(tmp, path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dump", help="pages-articles dump: .xml, .xml.bz2 or .xml.zst")
+    parser.add_argument("--output", default=GAZETTEER_PATH, help="Gazetteer file to write")
+    parser.add_argument("--version", help="Version recorded in the file (default: UTC timestamp)")
+    parser.add_argument("--min-anchor-count", type=int, default=3, help="Uses before an anchor becomes a name")
+    parser.add_argument("--limit", type=int, help="Read only this many pages")
+    args = parser.parse_args()
+
+    setup_logging()
+    started = time.perf_counter()
+    kinds = classify_pages(args.dump, args.limit)
+    print(f"Classified {len(kinds)} pages: {dict(Counter(kinds.values()))} ({time.perf_counter() - started:.1f}s)")
+    inbound, anchors = count_links(args.dump, kinds, args.limit)
+    rows = gazetteer_rows(kinds, inbound, anchors, args.min_anchor_count)
+    version = args.version or datetime.utcnow().strftime("%Y.%m.%d-%H%M%S")
+    write_gazetteer(args.output, rows, version, os.path.basename(args.dump))
+    counts = Counter(kind for _, kind, _ in rows)
+    print(f"Wrote {len(rows)} names ({', '.join(f'{counts[k]} {k}' for k in ENTITY_KINDS)}) "
+          f"to {args.output}, version {version}, in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
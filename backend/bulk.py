@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from database import AsyncSessionLocal, WikiArticle, Quiz, Question, quiz_response, \
+    claim_generation, hold_generation, release_generation
+from scraper import scrape_wikipedia_async, normalize_url
+from llm_cache import cached_generate_quiz
+from generator import GENERATION_MODE
+from blobstore import put_html_async, put_html_many
+from observability import span
+from questionbank import question_bank
+
+# Scraping is cheap and I/O bound; LLM calls are slow and rate limited
+BULK_SCRAPE_CONCURRENCY = int(os.getenv("BULK_SCRAPE_CONCURRENCY", "8"))
+BULK_LLM_CONCURRENCY = int(os.getenv("BULK_LLM_CONCURRENCY", "2"))
+# Generated quizzes are written in transactions of up to this many articles
+BULK_COMMIT_BATCH = int(os.getenv("BULK_COMMIT_BATCH", "25"))
+
+log = logging.getLogger(__name__)
+
+async def completed_urls(urls):
+    """
+    URLs that already have a complete quiz; a re-run skips them, which is
+    what makes an interrupted ingestion resumable.
+    """
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(select(WikiArticle.url).join(Quiz, Quiz.article_id == WikiArticle.id).where(
+            WikiArticle.url.in_(urls), Quiz.status == "complete"
+        ).distinct())
+        return set(rows.scalars())
+
+async def claim(url_key):
+    """
+    Takes the generation claim /generate-quiz uses for url_key and keeps it
+    fresh. Returns the heartbeat task to pass to release(), or None if
+    another request is generating the article.
+    """
+    async with AsyncSessionLocal() as db:
+        if not await claim_generation(db, url_key):
+            return None
+    return asyncio.create_task(hold_generation(url_key))
+
+async def release(url_key, heartbeat):
+    heartbeat.cancel()
+    try:
+        async with AsyncSessionLocal() as db:
+            await release_generation(db, url_key)
+    except Exception as e:
+        # The claim goes stale after CLAIM_TTL_SECONDS and is taken over then
+        log.warning("Could not release generation claim for %s: %s", url_key, e)
+
+async def add_quiz(db, article, ai_generated):
+    """
+    Adds a complete quiz with its questions and payload for article to the
+    session, without committing. Returns the question count.
+    """
+    response = quiz_response(article, ai_generated["quiz"], ai_generated["related_topics"])
+    quiz = Quiz(
+        article_id=article.id,
+        related_topics=ai_generated["related_topics"],
+        payload=orjson.dumps(response)
+    )
+    db.add(quiz)
+    await db.flush()
+    db.add_all([
+        Question(
+            quiz_id=quiz.id,
+            question_text=q["question"],
+            options=q["options"],
+            answer=q["answer"],
+            difficulty=q["difficulty"],
+            explanation=q["explanation"],
+            section=q["section"]
+        ) for q in response["quiz"]
+    ])
+    return len(response["quiz"])
+
+def _new_article(scraped, raw_html_hash):
+    return WikiArticle(
+        url=scraped["url"],
+        title=scraped["title"],
+        summary=scraped["summary"],
+        sections=scraped["sections"],
+        key_entities=scraped["key_entities"],
+        raw_html_hash=raw_html_hash,
+        revision_id=scraped.get("revision_id"),
+        content_hash=scraped.get("content_hash"),
+        checked_at=datetime.utcnow()
+    )
+
+async def write_batch(items):
+    """
+    Inserts articles, quizzes and questions for a batch of (scraped, generated)
+    pairs in one transaction. Returns {url: (article_id, question_count)}.
+    Articles that already exist (e.g. an earlier run failed at generation)
+    are reused rather than inserted again.
+    """
+    async with AsyncSessionLocal() as db:
+        urls = [scraped["url"] for scraped, _ in items]
+        articles = {a.url: a for a in (await db.execute(select(WikiArticle).where(WikiArticle.url.in_(urls)))).scalars()}
+        fresh = [(scraped, generated) for scraped, generated in items if scraped["url"] not in articles]
+        keys = await put_html_many(db, [scraped["raw_html"] for scraped, _ in fresh])
+        for (scraped, _), key in zip(fresh, keys):
+            articles[scraped["url"]] = _new_article(scraped, key)
+            db.add(articles[scraped["url"]])
+        await db.flush()
+
+        written = {}
+        for scraped, generated in items:
+            article = articles[scraped["url"]]
+            written[scraped["url"]] = (article.id, await add_quiz(db, article, generated))
+        with span("db_commit", "bulk_batch"):
+            await db.commit()
+        for article_id, _ in written.values():
+            question_bank.mark_stale(article_id)
+        return written
+
+async def write_one(scraped, generated):
+    """
+    Single-article fallback used when a batch insert hits a conflict.
+    """
+    async with AsyncSessionLocal() as db:
+        article = (await db.execute(select(WikiArticle).where(WikiArticle.url == scraped["url"]))).scalar()
+        if article is None:
+            article = _new_article(scraped, await put_html_async(db, scraped["raw_html"]))
+            db.add(article)
+            await db.flush()
+        count = await add_quiz(db, article, generated)
+        with span("db_commit", "bulk_one"):
+            await db.commit()
+        question_bank.mark_stale(article.id)
+        return article.id, count
+
+async def ingest_urls(urls, scrape_concurrency=BULK_SCRAPE_CONCURRENCY,
+                      llm_concurrency=BULK_LLM_CONCURRENCY, batch_size=BULK_COMMIT_BATCH, mode=None):
+    """
+    Async generator that scrapes, generates and stores quizzes for many URLs.
+    Scrapes and LLM calls run under separate concurrency limits; finished
+    quizzes are committed in batches. Each URL holds its generation claim
+    until its quiz is committed, so a concurrent /generate-quiz (or another
+    bulk job) does not generate it too; URLs claimed elsewhere are skipped.
+    Yields one result dict per URL as it settles and finally a summary dict
+    (type "summary"). mode overrides GENERATION_MODE ("single" or "mapreduce").
+    """
+    started = time.perf_counter()
+    urls = list(dict.fromkeys(u.strip() for u in urls if u and u.strip()))
+    counts = {"created": 0, "skipped": 0, "failed": 0}
+
+    def result(url, status, t0, **extra):
+        counts[status] += 1
+        return dict({"type": "result", "url": url, "status": status,
+                     "seconds": round(time.perf_counter() - t0, 3)}, **extra)
+
+    done = await completed_urls(urls) if urls else set()
+    for url in urls:
+        if url in done:
+            yield result(url, "skipped", started)
+    pending = [u for u in urls if u not in done]
+
+    scrape_slots = asyncio.Semaphore(scrape_concurrency)
+    llm_slots = asyncio.Semaphore(llm_concurrency)
+    ready = asyncio.Queue()
+    claims = {}  # url -> heartbeat task while its claim is held
+
+    async def settle(url):
+        heartbeat = claims.pop(url, None)
+        if heartbeat:
+            await release(normalize_url(url), heartbeat)
+
+    async def process(url):
+        t0 = time.perf_counter()
+        try:
+            heartbeat = await claim(normalize_url(url))
+            if heartbeat is None:
+                await ready.put((url, t0, None, None, None, "being generated elsewhere"))
+                return
+            claims[url] = heartbeat
+            # Another request may have finished it since completed_urls ran
+            if await completed_urls([url]):
+                await ready.put((url, t0, None, None, None, "already complete"))
+                return
+            async with scrape_slots:
+                scraped = await scrape_wikipedia_async(url, whole_article=(mode or GENERATION_MODE) == "mapreduce")
+            if not scraped:
+                raise Exception("Failed to scrape Wikipedia article.")
+            async with llm_slots:
+                generated = await run_in_threadpool(
+                    cached_generate_quiz, scraped["title"], scraped["full_text"], scraped.get("section_texts"), mode
+                )
+            if not generated or "error" in generated:
+                raise Exception(f"AI Quiz Generation failed: {(generated or {}).get('error', 'no result')}")
+            await ready.put((url, t0, scraped, generated, None, None))
+        except Exception as e:
+            await ready.put((url, t0, None, None, str(e), None))
+
+    async def flush(batch):
+        items = [(scraped, generated) for _, _, scraped, generated in batch]
+        try:
+            written = await write_batch(items)
+        except IntegrityError as e:
+            # Someone else inserted one of these articles meanwhile; isolate per URL
+            log.warning("Bulk insert conflict, retrying batch one by one: %s", e)
+            written = {}
+            for scraped, generated in items:
+                try:
+                    written[scraped["url"]] = await write_one(scraped, generated)
+                except Exception as one_error:
+                    written[scraped["url"]] = one_error
+        except Exception as e:
+            written = {scraped["url"]: e for scraped, _ in items}
+        out = []
+        for url, t0, scraped, _ in batch:
+            await settle(url)
+            outcome = written[scraped["url"]]
+            if isinstance(outcome, Exception):
+                out.append(result(url, "failed", t0, error=f"Database error: {outcome}"))
+            else:
+                out.append(result(url, "created", t0, article_id=outcome[0], questions=outcome[1]))
+        return out
+
+    tasks = [asyncio.create_task(process(url)) for url in pending]
+    batch = []
+    try:
+        for _ in pending:
+            url, t0, scraped, generated, error, skipped = await ready.get()
+            if skipped:
+                await settle(url)
+                yield result(url, "skipped", t0, reason=skipped)
+                continue
+            if error:
+                await settle(url)
+                log.warning("Bulk ingestion failed for %s: %s", url, error)
+                yield result(url, "failed", t0, error=error)
+                continue
+            batch.append((url, t0, scraped, generated))
+            if len(batch) >= batch_size:
+                for item in await flush(batch):
+                    yield item
+                batch = []
+        if batch:
+            for item in await flush(batch):
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        for url in list(claims):
+            await settle(url)
+
+    elapsed = time.perf_counter() - started
+    processed = counts["created"] + counts["failed"]
+    yield dict({
+        "type": "summary",
+        "total": len(urls),
+        "elapsed_seconds": round(elapsed, 3),
+        "urls_per_second": round(processed / elapsed, 3) if elapsed and processed else 0.0,
+    }, **counts)
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """
+    Bounded in-process cache with LRU eviction and a per-entry time-to-live.
+    Safe to share between the event loop and worker threads.
+
+    With maxweight set, weigh(value) gives each entry a weight (e.g. bytes)
+    and least recently used entries are also evicted to keep the total
+    within maxweight.
+    """
+
+    def __init__(self, maxsize=256, ttl=3600, maxweight=None, weigh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxweight = maxweight
+        self.weigh = weigh
+        self.weight = 0
+        self._data = OrderedDict()  # key -> (stored_at, value, weight)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            stored_at, value, weight = item
+            if time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self.weight -= weight
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        weight = self.weigh(value) if self.maxweight is not None else 0
+        with self._lock:
+            old = self._data.get(key)
+            if old is not None:
+                self.weight -= old[2]
+            self._data[key] = (time.monotonic(), value, weight)
+            self._data.move_to_end(key)
+            self.weight += weight
+            while len(self._data) > self.maxsize or (self.maxweight is not None and self.weight > self.maxweight):
+                _, evicted = self._data.popitem(last=False)
+                self.weight -= evicted[2]
+                self.evictions += 1
+
+    def peek(self, key):
+        """
+        The live value for key without counting a lookup or refreshing its
+        LRU position, or None.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                return None
+            return item[1]
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return None
+            self.weight -= item[2]
+            return item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+            if self.maxweight is not None:
+                stats["weight"] = self.weight
+                stats["maxweight"] = self.maxweight
+            return stats
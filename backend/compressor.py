@@ -0,0 +1,155 @@
+import logging
+import math
+import os
+import re
+import threading
+import time
+import numpy as np
+
+# Extractive compression of article text before it is put into the prompt
+PROMPT_COMPRESSION = os.getenv("PROMPT_COMPRESSION", "off").lower() in ("on", "1", "true")
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+# Rough English average for Gemini tokenization; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"\'(])')
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "been", "but", "by", "for", "from", "had", "has",
+    "have", "he", "her", "his", "in", "is", "it", "its", "of", "on", "or", "she", "that", "the",
+    "their", "they", "this", "to", "was", "were", "which", "who", "with"
+}
+
+log = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_totals = {"calls": 0, "original_tokens": 0, "compressed_tokens": 0, "seconds": 0.0}
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def split_sentences(paragraph):
+    return [s.strip() for s in SENTENCE_SPLIT.split(paragraph) if s.strip()]
+
+def score_sentences(sentences):
+    """
+    Centroid score of each sentence: cosine similarity between its TF-IDF
+    vector and the document centroid. Computed as one matrix product.
+    """
+    vocab = {}
+    rows, cols = [], []
+    for i, sentence in enumerate(sentences):
+        for word in WORD.findall(sentence.lower()):
+            if word in STOPWORDS or len(word) < 2:
+                continue
+            rows.append(i)
+            cols.append(vocab.setdefault(word, len(vocab)))
+    n = len(sentences)
+    if not vocab:
+        return np.zeros(n, dtype=np.float32)
+
+    counts = np.zeros((n, len(vocab)), dtype=np.float32)
+    np.add.at(counts, (np.array(rows), np.array(cols)), 1.0)
+    df = np.count_nonzero(counts, axis=0)
+    idf = np.log((1.0 + n) / (1.0 + df)) + 1.0
+    tfidf = np.log1p(counts) * idf
+    norms = np.linalg.norm(tfidf, axis=1, keepdims=True)
+    tfidf /= np.where(norms == 0, 1.0, norms)
+
+    centroid = tfidf.sum(axis=0)
+    centroid /= np.linalg.norm(centroid) or 1.0
+    return tfidf @ centroid
+
+def compress_sections(section_texts, token_budget=PROMPT_TOKEN_BUDGET):
+    """
+    Keeps the highest-scoring sentences of each section until token_budget is
+    spent. Every section first gets its best sentence (budget permitting), then
+    the rest is filled by score. Kept sentences stay in article order under
+    their heading. Returns (text, report).
+    """
+    start = time.perf_counter()
+    sentences = []  # (section index, text)
+    for index, section in enumerate(section_texts):
+        for paragraph in section["paragraphs"]:
+            sentences.extend((index, s) for s in split_sentences(paragraph))
+    original = "\n\n".join(
+        section["title"] + "\n\n" + "\n\n".join(section["paragraphs"]) for section in section_texts
+    )
+    original_tokens = estimate_tokens(original)
+
+    if original_tokens <= token_budget or not sentences:
+        text, kept = original, len(sentences)
+    else:
+        scores = score_sentences([s for _, s in sentences])
+        order = np.argsort(-scores, kind="stable")
+        best_per_section = {}
+        for i in order:
+            best_per_section.setdefault(sentences[i][0], int(i))
+        # Section leaders first (highest-scoring sections first), then the rest by score
+        leaders = sorted(best_per_section.values(), key=lambda i: -scores[i])
+        chosen = set()
+        used_sections = set()
+        spent = 0
+        for i in leaders + [int(i) for i in order]:
+            if i in chosen:
+                continue
+            section_index, sentence = sentences[i]
+            cost = estimate_tokens(sentence) + 1
+            if section_index not in used_sections:
+                cost += estimate_tokens(section_texts[section_index]["title"]) + 1
+            if spent + cost > token_budget:
+                continue
+            chosen.add(i)
+            used_sections.add(section_index)
+            spent += cost
+
+        picked = {}
+        for i in sorted(chosen):
+            section_index, sentence = sentences[i]
+            picked.setdefault(section_index, []).append(sentence)
+        text = "\n\n".join(
+            section_texts[index]["title"] + "\n\n" + " ".join(kept_sentences)
+            for index, kept_sentences in picked.items()
+        )
+        kept = len(chosen)
+
+    seconds = time.perf_counter() - start
+    compressed_tokens = estimate_tokens(text)
+    report = {
+        "original_tokens": original_tokens,
+        "compressed_tokens": compressed_tokens,
+        "ratio": round(original_tokens / compressed_tokens, 2) if compressed_tokens else 0.0,
+        "sentences_total": len(sentences),
+        "sentences_kept": kept,
+        "seconds": round(seconds, 4),
+    }
+    with _lock:
+        _totals["calls"] += 1
+        _totals["original_tokens"] += original_tokens
+        _totals["compressed_tokens"] += compressed_tokens
+        _totals["seconds"] += seconds
+    return text, report
+
+def compress_article(full_text, section_texts=None, token_budget=PROMPT_TOKEN_BUDGET):
+    """
+    Compresses an article for the prompt, using the scraper's per-section text
+    when available (whole article) and the plain full_text otherwise.
+    """
+    if not section_texts:
+        section_texts = [{"title": "Article", "paragraphs": [p for p in full_text.split("\n\n") if p.strip()]}]
+    text, report = compress_sections(section_texts, token_budget)
+    log.debug("Prompt compression: %d -> %d tokens (x%s, %d/%d sentences) in %.1f ms",
+              report["original_tokens"], report["compressed_tokens"], report["ratio"],
+              report["sentences_kept"], report["sentences_total"], report["seconds"] * 1000)
+    return text, report
+
+def compression_stats():
+    with _lock:
+        totals = dict(_totals)
+    return dict(
+        totals,
+        enabled=PROMPT_COMPRESSION,
+        token_budget=PROMPT_TOKEN_BUDGET,
+        ratio=round(totals["original_tokens"] / totals["compressed_tokens"], 2) if totals["compressed_tokens"] else 0.0,
+        seconds=round(totals["seconds"], 4),
+    )
@@ -0,0 +1,268 @@
+import logging
+import mmap
+from array import array
+import os
+import pickle
+import stat
+import threading
+import time
+import ahocorasick
+import xxhash
+
+# Names to look for: a versioned TSV of name, kind, canonical title (see build_gazetteer.py)
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "gazetteer.tsv"))
+# Compiled automata are cached here, keyed by the gazetteer's hash, so each
+# process after the first loads one instead of rebuilding it. Use a directory
+# only this user can write: a cache others can write is ignored
+GAZETTEER_CACHE_DIR = os.getenv("GAZETTEER_CACHE_DIR", "") or os.path.join(
+    os.getenv("XDG_CACHE_HOME", "") or os.path.join(os.path.expanduser("~"), ".cache"), "wikiquiz"
+)
+# Most entities kept per kind
+ENTITY_LIMIT = int(os.getenv("ENTITY_LIMIT", "15"))
+
+ENTITY_KINDS = ("people", "organizations", "locations")
+
+# The automaton maps each name to its index in an array of 64-bit entries
+# that pack everything a match needs, so no Python object is kept per name:
+# kind | name length | title length | title offset in the titles blob
+KIND_BITS = 2
+NAME_BITS = 10
+TITLE_BITS = 12
+MAX_NAME_CHARS = (1 << NAME_BITS) - 1
+MAX_TITLE_BYTES = (1 << TITLE_BITS) - 1
+
+log = logging.getLogger(__name__)
+
+def read_gazetteer(path):
+    """
+    (version, rows) for a gazetteer file: `# version: ...` in the header,
+    then one tab-separated name, kind, title per line (title defaults to
+    the name). Rows are yielded lazily; lines with an unknown kind are skipped.
+    """
+    version = None
+    with open(path, encoding="utf-8") as f:
+        header = []
+        for line in f:
+            if not line.startswith("#"):
+                break
+            header.append(line)
+        for line in header:
+            key, _, value = line[1:].partition(":")
+            if key.strip() == "version":
+                version = value.strip()
+
+    def rows():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("#") or not line.strip():
+                    continue
+                name, kind, *rest = line.rstrip("\n").split("\t")
+                if kind in ENTITY_KINDS and name:
+                    yield name, kind, rest[0] if rest and rest[0] else name
+
+    return version, rows()
+
+def _file_hash(path):
+    h = xxhash.xxh3_64()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def compile_gazetteer(rows):
+    """
+    (automaton, entries, titles blob) for gazetteer rows. The first row for
+    a name wins; names and titles too long to pack are skipped.
+    """
+    automaton = ahocorasick.Automaton(ahocorasick.STORE_INTS)
+    entries = array("Q")
+    titles = bytearray()
+    offsets = {}
+    for name, kind, title in rows:
+        if len(name) > MAX_NAME_CHARS or name in automaton:
+            continue
+        ref = offsets.get(title)
+        if ref is None:
+            encoded = title.encode("utf-8")
+            if len(encoded) > MAX_TITLE_BYTES:
+                continue
+            ref = offsets[title] = (len(titles) << TITLE_BITS) | len(encoded)
+            titles += encoded
+        automaton.add_word(name, len(entries))
+        entries.append((ref << (NAME_BITS + KIND_BITS)) | (len(name) << KIND_BITS) | ENTITY_KINDS.index(kind))
+    automaton.make_automaton()
+    return automaton, entries, bytes(titles)
+
+def _write_bytes(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+def _map(path):
+    with open(path, "rb") as f:
+        # mmap cannot map an empty file
+        if not os.fstat(f.fileno()).st_size:
+            return memoryview(b"")
+        return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+class _AutomatonUnpickler(pickle.Unpickler):
+    """
+    Restores an Automaton and nothing else, so a planted cache file cannot
+    make unpickling call anything.
+    """
+
+    def find_class(self, module, name):
+        if (module, name) == ("ahocorasick", "Automaton"):
+            return ahocorasick.Automaton
+        raise pickle.UnpicklingError(f"Unexpected {module}.{name} in a gazetteer cache")
+
+def _private_dir(path):
+    """
+    Creates path (mode 0700) if missing. True if it belongs to this user and
+    no one else can write to it.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        return False
+    return not info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+def _write_atomic(path, write):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+class Gazetteer:
+    """
+    A gazetteer compiled into an Aho-Corasick automaton: extract() finds
+    every known name in a text in one pass, however many names there are.
+    The entry table and titles blob are memory-mapped from the cache, so
+    worker processes share their pages.
+    """
+
+    def __init__(self, automaton, entries, titles, version=None, origin="built", load_seconds=0.0):
+        self.automaton = automaton
+        self.entries = entries
+        self.titles = titles
+        self.version = version
+        self.origin = origin
+        self.load_seconds = load_seconds
+
+    @classmethod
+    def load(cls, path=GAZETTEER_PATH, cache_dir=GAZETTEER_CACHE_DIR):
+        """
+        Loads the compiled automaton for path from cache_dir, compiling and
+        caching it first if this version of the file has not been seen.
+        """
+        started = time.perf_counter()
+        version, rows = read_gazetteer(path)
+        stem = os.path.join(cache_dir, f"gazetteer-{_file_hash(path)}")
+        files = [stem + suffix for suffix in (".automaton", ".entries", ".titles")]
+        try:
+            cacheable = _private_dir(cache_dir)
+            if not cacheable:
+                log.warning("Not caching the compiled gazetteer: %s is writable by other users", cache_dir)
+        except OSError as e:
+            log.warning("Could not cache the compiled gazetteer in %s: %s", cache_dir, e)
+            cacheable = False
+
+        automaton = None
+        if cacheable and all(os.path.exists(f) for f in files):
+            try:
+                # Unpickling is several times faster than Automaton.save()/load()
+                with open(files[0], "rb") as f:
+                    automaton = _AutomatonUnpickler(f).load()
+            except (pickle.UnpicklingError, EOFError, TypeError, ValueError) as e:
+                log.warning("Ignoring unreadable gazetteer cache %s: %s", files[0], e)
+        if automaton is not None:
+            origin = "cache"
+        else:
+            automaton, entries, titles = compile_gazetteer(rows)
+            origin = "built"
+            if not cacheable:
+                return cls(automaton, entries, titles, version, origin, time.perf_counter() - started)
+            try:
+                # The automaton goes last: its presence marks a complete cache
+                _write_atomic(files[1], lambda tmp: _write_bytes(tmp, entries.tobytes()))
+                _write_atomic(files[2], lambda tmp: _write_bytes(tmp, titles))
+                _write_atomic(files[0], lambda tmp: _write_bytes(tmp, pickle.dumps(automaton, pickle.HIGHEST_PROTOCOL)))
+            except OSError as e:
+                log.warning("Could not cache the compiled gazetteer in %s: %s", cache_dir, e)
+                return cls(automaton, entries, titles, version, origin, time.perf_counter() - started)
+        entries = _map(files[1]).cast("Q")
+        return cls(automaton, entries, _map(files[2]), version, origin, time.perf_counter() - started)
+
+    def title(self, ref):
+        start, length = ref >> TITLE_BITS, ref & MAX_TITLE_BYTES
+        return bytes(self.titles[start:start + length]).decode("utf-8")
+
+    def extract(self, text, limit=ENTITY_LIMIT):
+        """
+        {kind: [title, ...]} for the names found in text as whole words, in
+        order of first mention, each title once, at most limit per kind.
+        Overlapping names resolve to the leftmost longest one.
+        """
+        entities = {kind: [] for kind in ENTITY_KINDS}
+        if not len(self.automaton):
+            return entities
+        seen = set()
+        room = limit * len(ENTITY_KINDS)
+        size = len(text)
+        for end, index in self.automaton.iter_long(text):
+            value = self.entries[index]
+            start = end - ((value >> KIND_BITS) & MAX_NAME_CHARS) + 1
+            if (start and text[start - 1].isalnum()) or (end + 1 < size and text[end + 1].isalnum()):
+                continue
+            ref = value >> (NAME_BITS + KIND_BITS)
+            if ref in seen:
+                continue
+            seen.add(ref)
+            bucket = entities[ENTITY_KINDS[value & ((1 << KIND_BITS) - 1)]]
+            if len(bucket) < limit:
+                bucket.append(self.title(ref))
+                room -= 1
+                if not room:
+                    break
+        return entities
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "names": len(self.automaton),
+            "origin": self.origin,
+            "load_seconds": round(self.load_seconds, 3),
+        }
+
+_gazetteer = None
+_gazetteer_error = None
+_gazetteer_lock = threading.Lock()
+
+def get_gazetteer():
+    """
+    The process-wide Gazetteer, loaded on first use, or None if the
+    gazetteer file cannot be read (entities then come back empty).
+    """
+    global _gazetteer, _gazetteer_error
+    if _gazetteer is None and _gazetteer_error is None:
+        with _gazetteer_lock:
+            if _gazetteer is None and _gazetteer_error is None:
+                try:
+                    _gazetteer = Gazetteer.load()
+                    log.info("Gazetteer %s loaded: %s", GAZETTEER_PATH, _gazetteer.stats())
+                except (OSError, ValueError) as e:
+                    _gazetteer_error = str(e)
+                    log.warning("No gazetteer, entity extraction disabled: %s", e)
+    return _gazetteer
+
+def extract_entities(text, limit=ENTITY_LIMIT):
+    gazetteer = get_gazetteer()
+    if gazetteer is None:
+        return {kind: [] for kind in ENTITY_KINDS}
+    return gazetteer.extract(text, limit)
+
+def gazetteer_stats():
+    gazetteer = get_gazetteer()
+    return gazetteer.stats() if gazetteer else {"error": _gazetteer_error}
@@ -0,0 +1,298 @@
+from html.parser import HTMLParser
+import os
+import re
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional; fall back to the stdlib tokenizer
+    etree = None
+
+# Extraction limits (kept in line with what the LLM prompt can use)
+TEXT_BUDGET = 10000
+LINK_LIMIT = 15
+
+# Section text that whole-article generation reads: map-reduce fills at most
+# MAPREDUCE_MAX_CHUNKS chunks of MAPREDUCE_CHUNK_CHARS before
+# generator.plan_chunks has to grow them, and prompt compression draws from
+# the same amount. Same variables and defaults as generator.py, read here so
+# parsing does not import the LLM client.
+WHOLE_ARTICLE_BUDGET = int(os.getenv("MAPREDUCE_MAX_CHUNKS", "8")) * int(os.getenv("MAPREDUCE_CHUNK_CHARS", "6000"))
+
+def _default_section_budget():
+    """
+    Per-section text only pays off when something reads the whole article
+    (GENERATION_MODE=mapreduce or PROMPT_COMPRESSION); otherwise none is
+    kept and paragraphs past the text budget are skipped. Callers that ask
+    for map-reduce per call scrape with WHOLE_ARTICLE_BUDGET instead.
+    """
+    mapreduce = os.getenv("GENERATION_MODE", "single") == "mapreduce"
+    compression = os.getenv("PROMPT_COMPRESSION", "off").lower() in ("on", "1", "true")
+    return WHOLE_ARTICLE_BUDGET if mapreduce or compression else 0
+
+# Per-section text kept by default (0 disables it)
+SECTION_TEXT_BUDGET = int(os.getenv("SCRAPER_SECTION_TEXT_BUDGET", "") or _default_section_budget())
+CHUNK_SIZE = 16384
+# MediaWiki embeds the revision a page was rendered from in its page config
+REVISION_ID = re.compile(rb'"wgRevisionId":(\d+)')
+
+# "lxml" (libxml2, much faster) or "html.parser" (pure Python)
+PARSER_BACKEND = os.getenv("SCRAPER_PARSER", "lxml")
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+SKIP_TAGS = {"style", "script"}
+SKIP_CLASSES = {"reference", "mw-editsection"}
+
+class ArticleExtractor:
+    """
+    Event-driven extractor that collects title, summary, sections, full text and
+    links in a single pass over a Wikipedia page. Implements the lxml parser
+    target interface (start/end/data/close) so it can be driven by libxml2
+    directly or by the stdlib HTMLParser adapter below.
+
+    Only direct children of .mw-parser-output (p, h2, h3 and the .mw-heading
+    wrappers used by newer MediaWiki markup) contribute to text. Citation
+    markers and [edit] links are skipped while streaming, so no regex cleanup
+    is needed afterwards. Once the text and section budgets are met, further
+    paragraphs are skipped without buffering their text, but h2/h3 headings
+    are still collected into `sections`; `done` is set when .mw-parser-output
+    closes and the caller stops feeding input.
+
+    Alongside the truncated full text, paragraphs are grouped under their
+    h2/h3 heading in `section_texts` (up to section_budget characters) so
+    long articles can be processed section by section.
+    """
+
+    def __init__(self, text_budget=TEXT_BUDGET, link_limit=LINK_LIMIT, section_budget=SECTION_TEXT_BUDGET):
+        self.text_budget = text_budget
+        self.link_limit = link_limit
+        self.section_budget = section_budget
+
+        self.title = None
+        self.summary = ""
+        self.sections = []
+        self.text_parts = []
+        self.text_len = 0
+        self.section_texts = []     # [{"title": heading, "paragraphs": [...]}]
+        self.section_len = 0
+        self.links = []
+        self.found_content = False
+        self.done = False
+
+        self._depth = 0
+        self._in_content_text = 0   # depth of #mw-content-text, 0 when outside
+        self._root = 0              # depth of .mw-parser-output, 0 when outside
+        self._title_depth = 0
+        self._title_buf = None
+        self._heading_wrapper = 0   # depth of a .mw-heading wrapper div
+        self._block = None          # (depth, tag, is_heading, has_wrapper)
+        self._block_buf = None
+        self._headline_depth = 0
+        self._headline_buf = None
+        self._headline_text = None
+        self._skip_depth = 0
+        self._link_depth = 0
+        self._link_buf = None
+
+    # -- parser target interface -------------------------------------------------
+
+    def start(self, tag, attrib):
+        self._depth += 1
+        depth = self._depth
+        if self.done:
+            return
+
+        if self._skip_depth:
+            return
+
+        classes = attrib.get("class", "")
+        if tag in SKIP_TAGS or (classes and SKIP_CLASSES.intersection(classes.split())):
+            if self._block is not None or self._title_buf is not None:
+                self._skip_depth = depth
+            return
+
+        if tag == "h1" and self.title is None and attrib.get("id") == "firstHeading":
+            self._title_depth = depth
+            self._title_buf = []
+            return
+
+        if tag == "div":
+            if not self._in_content_text and attrib.get("id") == "mw-content-text":
+                self._in_content_text = depth
+            elif self._in_content_text and not self._root and not self.found_content \
+                    and "mw-parser-output" in classes.split():
+                self._root = depth
+                self.found_content = True
+            elif self._root and depth == self._root + 1 and "mw-heading" in classes.split():
+                self._heading_wrapper = depth
+            return
+
+        if not self._root:
+            return
+
+        if tag == "a" and self._link_buf is None and len(self.links) < self.link_limit:
+            href = attrib.get("href", "")
+            if href.startswith("/wiki/"):
+                self._link_depth = depth
+                self._link_buf = []
+
+        if self._block is None:
+            parent = self._heading_wrapper or self._root
+            if depth == parent + 1 and (tag == "p" or tag == "h2" or tag == "h3"):
+                is_heading = tag != "p"
+                if not is_heading and self._budgets_met():
+                    return
+                self._block = (depth, tag, is_heading, bool(self._heading_wrapper))
+                self._block_buf = []
+        elif tag == "span" and self._block[2] and "mw-headline" in classes.split():
+            self._headline_depth = depth
+            self._headline_buf = []
+
+    def end(self, tag):
+        depth = self._depth
+        self._depth -= 1
+        if self.done:
+            return
+
+        if self._skip_depth:
+            if depth == self._skip_depth:
+                self._skip_depth = 0
+            return
+
+        if self._title_buf is not None and depth == self._title_depth:
+            self.title = "".join(self._title_buf).strip()
+            self._title_buf = None
+            return
+
+        if self._link_buf is not None and depth == self._link_depth:
+            self.links.append("".join(self._link_buf).strip())
+            self._link_buf = None
+
+        if self._headline_buf is not None and depth == self._headline_depth:
+            self._headline_text = "".join(self._headline_buf).strip()
+            self._headline_buf = None
+
+        if self._block is not None and depth == self._block[0]:
+            self._finish_block()
+        elif self._heading_wrapper and depth == self._heading_wrapper:
+            self._heading_wrapper = 0
+        elif self._root and depth == self._root:
+            self._root = 0
+            self.done = True
+        elif self._in_content_text and depth == self._in_content_text:
+            self._in_content_text = 0
+
+    def data(self, text):
+        if self.done or self._skip_depth:
+            return
+        if self._title_buf is not None:
+            self._title_buf.append(text)
+        if self._block_buf is not None:
+            self._block_buf.append(text)
+        if self._headline_buf is not None:
+            self._headline_buf.append(text)
+        if self._link_buf is not None:
+            self._link_buf.append(text)
+
+    def close(self):
+        return self
+
+    # -- helpers -----------------------------------------------------------------
+
+    def _budgets_met(self):
+        return bool(self.summary) and self.text_len >= self.text_budget \
+            and self.section_len >= self.section_budget
+
+    def _finish_block(self):
+        _, tag, is_heading, has_wrapper = self._block
+        text = "".join(self._block_buf).strip()
+        headline = self._headline_text
+        self._block = None
+        self._block_buf = None
+        self._headline_text = None
+
+        if is_heading:
+            # Legacy markup names the section in span.mw-headline; newer markup
+            # wraps a bare heading in div.mw-heading.
+            if headline:
+                self.sections.append(headline)
+                text = headline
+            elif has_wrapper and text:
+                self.sections.append(text)
+        elif text and not self.summary:
+            self.summary = text
+
+        if text and self.text_len < self.text_budget:
+            self.text_parts.append(text)
+            self.text_parts.append("\n\n")
+            self.text_len += len(text) + 2
+
+        if text and self.section_len < self.section_budget:
+            if is_heading:
+                self.section_texts.append({"title": text, "paragraphs": []})
+            else:
+                if not self.section_texts:
+                    self.section_texts.append({"title": "Introduction", "paragraphs": []})
+                self.section_texts[-1]["paragraphs"].append(text)
+                self.section_len += len(text)
+
+    @property
+    def full_text(self):
+        return "".join(self.text_parts)[:self.text_budget]
+
+class _StdlibAdapter(HTMLParser):
+    """
+    Drives an ArticleExtractor from the pure-Python tokenizer.
+    """
+
+    def __init__(self, target):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, {k: v or "" for k, v in attrs})
+        if tag in VOID_TAGS:
+            self.target.end(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.target.start(tag, {k: v or "" for k, v in attrs})
+        self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in VOID_TAGS:
+            self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+def _make_parser(target, backend):
+    if backend == "lxml" and etree is not None:
+        return etree.HTMLParser(target=target, remove_comments=True)
+    return _StdlibAdapter(target)
+
+def extract_article(content, text_budget=TEXT_BUDGET, link_limit=LINK_LIMIT, backend=None,
+                    section_budget=SECTION_TEXT_BUDGET):
+    """
+    Runs the single-pass extractor over raw page content (bytes or str).
+    Input is fed in chunks and parsing stops as soon as the extractor is done.
+    """
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+
+    extractor = ArticleExtractor(text_budget=text_budget, link_limit=link_limit, section_budget=section_budget)
+    parser = _make_parser(extractor, backend or PARSER_BACKEND)
+    for offset in range(0, len(content), CHUNK_SIZE):
+        parser.feed(content[offset:offset + CHUNK_SIZE])
+        if extractor.done:
+            break
+    else:
+        parser.close()
+    return extractor
+
+def page_revision(content):
+    """
+    The revision id a Wikipedia page was rendered from, or None.
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    match = REVISION_ID.search(content)
+    return int(match.group(1)) if match else None
@@ -0,0 +1,72 @@
+import hashlib
+import html
+import os
+import re
+from urllib.parse import unquote, urlsplit
+from extractor import page_revision
+
+# Saved Wikipedia pages used by SCRAPER_PROVIDER=fixtures and benchmarks/fixture_server.py
+FIXTURE_DIR = os.getenv(
+    "SCRAPER_FIXTURE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "fixtures")
+)
+
+PAGE_TITLE = re.compile(rb'(<span class="mw-page-title-main">)[^<]*(</span>)')
+HEAD_TITLE = re.compile(rb"(<title>)[^<]*?( - Wikipedia</title>)")
+
+_pages = None
+
+def load_fixtures():
+    """
+    {file stem: html bytes} for every .html file in FIXTURE_DIR, read once.
+    """
+    global _pages
+    if _pages is None:
+        pages = {}
+        for name in sorted(os.listdir(FIXTURE_DIR)):
+            if name.endswith(".html"):
+                with open(os.path.join(FIXTURE_DIR, name), "rb") as f:
+                    pages[name[:-5].lower()] = f.read()
+        _pages = pages
+    return _pages
+
+def title_from_url(url):
+    path = unquote(urlsplit(url).path)
+    return path.rsplit("/", 1)[-1].replace("_", " ")
+
+def fixture_page(title):
+    """
+    HTML for the article `title`. A fixture whose file name matches the title
+    (alan_turing.html for "Alan Turing") is served as is; any other title gets
+    a fixture picked by hash with its heading rewritten, so every title is a
+    distinct article with realistic content. None when there are no fixtures.
+    """
+    pages = load_fixtures()
+    if not pages or not title:
+        return None
+    stem = re.sub(r"\W+", "_", title.lower()).strip("_")
+    if stem in pages:
+        return pages[stem]
+    names = list(pages)
+    page = pages[names[int(hashlib.md5(title.encode()).hexdigest(), 16) % len(names)]]
+    escaped = html.escape(title).encode()
+    page = PAGE_TITLE.sub(lambda m: m.group(1) + escaped + m.group(2), page, count=1)
+    return HEAD_TITLE.sub(lambda m: m.group(1) + escaped + m.group(2), page, count=1)
+
+def fixture_etag(page):
+    return '"' + hashlib.md5(page).hexdigest() + '"'
+
+def fixture_revisions(titles):
+    """
+    Answer to a MediaWiki revisions query (action=query&prop=revisions,
+    formatversion=2) for titles, with each page's revision read from its
+    fixture. Titles with no fixture are reported missing.
+    """
+    pages = []
+    for title in titles:
+        page = fixture_page(title)
+        revision = page_revision(page) if page else None
+        if revision is None:
+            pages.append({"title": title, "missing": True})
+        else:
+            pages.append({"title": title, "revisions": [{"revid": revision}]})
+    return {"batchcomplete": True, "query": {"pages": pages}}
@@ -1,17 +1,32 @@
 import os
 import json
+import logging
+import math
 import re
-import google.generativeai as genai
-from pydantic import BaseModel, Field
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel, Field, ValidationError
 from typing import List
 from dotenv import load_dotenv
+from llm_client import get_client, LLMError, MODEL_NAME
+from observability import ERRORS
 
 # Load environment variables with absolute path
 env_path = os.path.join(os.path.dirname(__file__), '.env')
 load_dotenv(dotenv_path=env_path)
 
-print(f"Debug: .env path used: {env_path}")
-print(f"Debug: API Key present: {'Yes' if os.getenv('GOOGLE_API_KEY') else 'No'}")
+log = logging.getLogger(__name__)
+log.debug(".env path used: %s; API key present: %s", env_path, "yes" if os.getenv("GOOGLE_API_KEY") else "no")
+
+# "single": one prompt over the truncated text; "mapreduce": one prompt per
+# group of sections, run concurrently and merged (covers the whole article)
+GENERATION_MODE = os.getenv("GENERATION_MODE", "single")
+MAPREDUCE_FAN_OUT = int(os.getenv("MAPREDUCE_FAN_OUT", "4"))
+MAPREDUCE_MAX_CHUNKS = int(os.getenv("MAPREDUCE_MAX_CHUNKS", "8"))
+MAPREDUCE_CHUNK_CHARS = int(os.getenv("MAPREDUCE_CHUNK_CHARS", "6000"))
+QUIZ_QUESTIONS = int(os.getenv("QUIZ_QUESTIONS", "10"))
+
+# Bump whenever build_prompt changes; it is part of the generation cache key
+PROMPT_VERSION = "1"
 
 # Define Pydantic models for structured output (used for type hints/reference)
 class QuestionModel(BaseModel):
@@ -26,20 +41,10 @@ class QuizModel(BaseModel):
     quiz: List[QuestionModel]
     related_topics: List[str]
 
-def generate_quiz(article_title: str, article_content: str):
+def build_prompt(article_title: str, article_content: str):
     """
-    Generates a quiz and related topics using Gemini LLM (Direct Library).
+    Builds the quiz-generation prompt for an article.
     """
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        print("GOOGLE_API_KEY not found in environment variables.")
-        return None
-
-    genai.configure(api_key=api_key)
-    
-    # Use a robust current model
-    model = genai.GenerativeModel('gemini-flash-latest')
-
     prompt = f"""You are a professional quiz generator. Based on the following Wikipedia article content about "{article_title}", generate a quiz.
     
     Requirements:
@@ -74,35 +79,309 @@ def generate_quiz(article_title: str, article_content: str):
     
     Return ONLY the JSON object. Do not provide any conversational text.
     """
+    return prompt
+
+def get_client_or_none():
+    """
+    Returns the shared LLM client, or None without an API key.
+    """
+    client = get_client()
+    if not client.available():
+        log.error("GOOGLE_API_KEY not found in environment variables.")
+        return None
+    return client
+
+def generate_quiz(article_title: str, article_content: str):
+    """
+    Generates a quiz and related topics using Gemini LLM (Direct Library).
+    Output is constrained to QuizModel and validated; transient provider
+    errors are retried by the client.
+    """
+    client = get_client_or_none()
+    if client is None:
+        return None
+
+    prompt = build_prompt(article_title, article_content)
 
     try:
-        print("Sending request to Gemini (Direct API)...")
-        response = model.generate_content(prompt)
-        content = response.text
-        
-        print("--- RAW AI RESPONSE START ---")
-        print(content)
-        print("--- RAW AI RESPONSE END ---")
-        
-        # Parse JSON from response
-        # Remove potential markdown code blocks
-        json_match = re.search(r'\{.*\}', content, re.DOTALL)
-        if json_match:
-            content = json_match.group(0)
-        
-        parsed_data = json.loads(content)
-        
+        log.debug("Sending quiz request to the LLM")
+        parsed_data = client.generate_structured(prompt, QuizModel).model_dump()
+
         # Basic validation
-        if "quiz" not in parsed_data or not parsed_data["quiz"]:
-            raise Exception("AI response missing 'quiz' field or is empty.")
-            
-        print("Successfully generated and parsed quiz.")
+        if not parsed_data["quiz"]:
+            raise LLMError("AI response missing 'quiz' field or is empty.")
+
+        log.debug("Generated and parsed quiz with %d questions", len(parsed_data["quiz"]))
         return parsed_data
-        
+
+    except LLMError as e:
+        log.error("Error generating quiz: %s", e)
+        ERRORS.labels("llm").inc()
+        return {"error": str(e), "status": e.status}
     except Exception as e:
-        print(f"Error generating quiz: {e}")
+        log.exception("Error generating quiz")
+        ERRORS.labels("llm").inc()
         return {"error": str(e)}
 
+class QuizStreamParser:
+    """
+    Incremental parser for the model's JSON output. Text is fed as it streams
+    in; every object in the "quiz" array is returned as soon as its closing
+    brace arrives, without waiting for the rest of the document.
+    """
+
+    QUIZ_KEY = re.compile(r'"quiz"\s*:\s*\[')
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0              # next unscanned character
+        self.in_array = False
+        self.array_done = False
+        self.obj_start = None     # start of the object being scanned
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, text):
+        """
+        Adds streamed text and returns the list of question dicts completed by it.
+        """
+        self.buffer += text
+        completed = []
+        if not self.in_array and not self.array_done:
+            match = self.QUIZ_KEY.search(self.buffer)
+            if not match:
+                return completed
+            self.in_array = True
+            self.pos = match.end()
+
+        buf = self.buffer
+        i = self.pos
+        while self.in_array and i < len(buf):
+            ch = buf[i]
+            if self.obj_start is None:
+                if ch == "{":
+                    self.obj_start = i
+                    self.depth = 1
+                elif ch == "]":
+                    self.in_array = False
+                    self.array_done = True
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        completed.append(json.loads(buf[self.obj_start:i + 1]))
+                    except ValueError as e:
+                        log.warning("Skipping malformed streamed question: %s", e)
+                    self.obj_start = None
+            i += 1
+        self.pos = i
+        return completed
+
+    def result(self):
+        """
+        Parses the complete buffered response (used for related_topics).
+        """
+        json_match = re.search(r'\{.*\}', self.buffer, re.DOTALL)
+        return json.loads(json_match.group(0) if json_match else self.buffer)
+
+def validate_question(raw):
+    """
+    Validates one question against QuestionModel; returns a dict or None.
+    """
+    if not isinstance(raw, dict):
+        return None
+    raw.setdefault("section", "General")
+    try:
+        return QuestionModel.model_validate(raw).model_dump()
+    except ValidationError as e:
+        log.warning("Skipping invalid question: %s", e)
+        return None
+
+def generate_quiz_stream(article_title: str, article_content: str):
+    """
+    Streaming variant of generate_quiz. Yields ("question", dict) for each
+    validated question as soon as the model finishes writing it, then
+    ("related_topics", list). Raises on configuration or model errors.
+    """
+    client = get_client_or_none()
+    if client is None:
+        raise Exception("GOOGLE_API_KEY not found in environment variables.")
+
+    log.debug("Streaming quiz request to the LLM")
+    parser = QuizStreamParser()
+    count = 0
+    for text in client.stream(build_prompt(article_title, article_content), QuizModel):
+        for raw in parser.feed(text):
+            question = validate_question(raw)
+            if question:
+                count += 1
+                yield "question", question
+
+    if count == 0:
+        raise Exception("AI response contained no valid questions.")
+
+    try:
+        related_topics = parser.result().get("related_topics", [])
+    except ValueError as e:
+        log.warning("Could not parse related topics: %s", e)
+        related_topics = []
+    log.debug("Streamed %d questions", count)
+    yield "related_topics", related_topics
+
+def build_chunk_prompt(article_title: str, section_titles: List[str], chunk_text: str, n_questions: int):
+    """
+    Prompt for one chunk of sections in map-reduce generation.
+    """
+    names = ", ".join(f'"{name}"' for name in section_titles)
+    prompt = f"""You are a professional quiz generator. Below is part of the Wikipedia article "{article_title}", covering the sections {names}.
+
+    Requirements:
+    1. Generate {n_questions} questions answerable from this text only.
+    2. Each question must have 4 options (A, B, C, D).
+    3. Identify the correct answer (MUST be an exact string match to one of the options you provided).
+    4. Provide a short explanation grounded in the text.
+    5. Assign a difficulty level (easy, medium, hard), mixing levels.
+    6. Set "section" to the name of the section the question comes from (one of {names}).
+    7. Suggest 1-3 related Wikipedia topics for further reading.
+
+    Article Content:
+    {chunk_text}
+
+    Return ONLY a valid JSON object with the structure:
+    {{"quiz": [{{"question": "...", "options": ["...", "...", "...", "..."], "answer": "...", "difficulty": "easy", "explanation": "...", "section": "..."}}], "related_topics": ["..."]}}
+    """
+    return prompt
+
+def plan_chunks(section_texts, chunk_chars=MAPREDUCE_CHUNK_CHARS, max_chunks=MAPREDUCE_MAX_CHUNKS):
+    """
+    Groups consecutive sections into chunks of roughly chunk_chars, splitting
+    oversized sections at paragraph boundaries. The chunk size grows if needed
+    so the whole article fits in max_chunks prompts.
+    Returns [{"sections": [names], "text": str}].
+    """
+    total = sum(len(p) for s in section_texts for p in s["paragraphs"])
+    if total == 0:
+        return []
+    chunk_chars = max(chunk_chars, math.ceil(total / max_chunks))
+
+    chunks = []
+    current = {"sections": [], "parts": [], "len": 0}
+    for section in section_texts:
+        for paragraph in section["paragraphs"]:
+            if current["len"] and current["len"] + len(paragraph) > chunk_chars:
+                chunks.append(current)
+                current = {"sections": [], "parts": [], "len": 0}
+            if section["title"] not in current["sections"]:
+                current["sections"].append(section["title"])
+                current["parts"].append(section["title"])
+            current["parts"].append(paragraph)
+            current["len"] += len(paragraph)
+    if current["len"]:
+        chunks.append(current)
+    return [{"sections": c["sections"], "text": "\n\n".join(c["parts"])} for c in chunks]
+
+def _generate_chunk(client, article_title, chunk, n_questions):
+    prompt = build_chunk_prompt(article_title, chunk["sections"], chunk["text"], n_questions)
+    parsed = client.generate_structured(prompt, QuizModel).model_dump()
+    questions = parsed["quiz"]
+    # Keep the section label within the chunk it came from
+    for q in questions:
+        if q["section"] not in chunk["sections"]:
+            q["section"] = chunk["sections"][0]
+    return questions, parsed["related_topics"]
+
+def _question_fingerprint(text):
+    return frozenset(re.findall(r"[a-z0-9]+", text.lower()))
+
+def merge_quiz_results(chunk_results, target=QUIZ_QUESTIONS, topic_limit=5):
+    """
+    Reduce step: drops near-duplicate questions, then picks up to target
+    questions round-robin across sections, preferring whichever difficulty
+    is least represented so far. Related topics are merged in order.
+    """
+    seen = []
+    by_section = {}
+    for questions, _ in chunk_results:
+        for q in questions:
+            fingerprint = _question_fingerprint(q["question"])
+            duplicate = any(
+                len(fingerprint & other) / max(len(fingerprint | other), 1) >= 0.8 for other in seen
+            )
+            if duplicate:
+                continue
+            seen.append(fingerprint)
+            by_section.setdefault(q["section"], []).append(q)
+
+    picked = []
+    difficulty_counts = {"easy": 0, "medium": 0, "hard": 0}
+    while len(picked) < target and any(by_section.values()):
+        for questions in by_section.values():
+            if not questions or len(picked) >= target:
+                continue
+            best = min(questions, key=lambda q: difficulty_counts.get(q["difficulty"].lower(), 0))
+            questions.remove(best)
+            picked.append(best)
+            key = best["difficulty"].lower()
+            difficulty_counts[key] = difficulty_counts.get(key, 0) + 1
+
+    topics = []
+    for _, related in chunk_results:
+        for topic in related:
+            if isinstance(topic, str) and topic.lower() not in {t.lower() for t in topics}:
+                topics.append(topic)
+    return {"quiz": picked, "related_topics": topics[:topic_limit]}
+
+def generate_quiz_sections(article_title: str, section_texts, fan_out=MAPREDUCE_FAN_OUT):
+    """
+    Map-reduce generation: one prompt per chunk of sections, up to fan_out
+    in flight at once, merged by merge_quiz_results. Wall-clock time is that
+    of the slowest chunk (per wave of fan_out). Same return contract as generate_quiz.
+    """
+    client = get_client_or_none()
+    if client is None:
+        return None
+
+    chunks = plan_chunks(section_texts)
+    if not chunks:
+        return {"error": "Article has no section text to generate from."}
+    # Ask for some surplus so deduplication and balancing have room to choose
+    per_chunk = max(2, math.ceil(QUIZ_QUESTIONS * 1.5 / len(chunks)))
+    log.info("Map-reduce generation: %d chunks, %d questions each, fan-out %d", len(chunks), per_chunk, fan_out)
+
+    errors = []
+
+    def run(chunk):
+        try:
+            return _generate_chunk(client, article_title, chunk, per_chunk)
+        except Exception as e:
+            log.warning("Chunk %r failed: %s", chunk["sections"][0], e)
+            ERRORS.labels("llm_chunk").inc()
+            errors.append(e)
+            return [], []
+
+    with ThreadPoolExecutor(max_workers=max(1, fan_out)) as pool:
+        chunk_results = list(pool.map(run, chunks))
+
+    merged = merge_quiz_results(chunk_results)
+    if not merged["quiz"]:
+        if errors:
+            return {"error": str(errors[0]), "status": getattr(errors[0], "status", 500)}
+        return {"error": "No chunk produced valid questions."}
+    log.info("Merged %d questions from %d chunks", len(merged["quiz"]), len(chunks))
+    return merged
+
 if __name__ == "__main__":
     # Test generation with dummy content
     test_title = "Alan Turing"
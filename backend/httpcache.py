@@ -0,0 +1,213 @@
+import gzip
+import os
+from datetime import timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import xxhash
+import zstandard
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.datastructures import Headers, MutableHeaders
+from cache import TTLCache
+from observability import count_cache
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; br is then not offered
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+# Compressed bodies kept per (ETag, encoding), so repeat views skip compression
+COMPRESSION_CACHE_SIZE = int(os.getenv("COMPRESSION_CACHE_SIZE", "512"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+def _zstd(data):
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+def _gzip(data):
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+# Preferred first when the client accepts several equally
+ENCODERS = {"zstd": _zstd}
+if brotli is not None:
+    ENCODERS["br"] = lambda data: brotli.compress(data, quality=5)
+ENCODERS["gzip"] = _gzip
+
+def http_date(dt):
+    """
+    RFC 9110 date for a naive UTC datetime (how the database stores them).
+    """
+    return format_datetime(dt.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+def quiz_etag(quiz_id, created_at):
+    """
+    Strong validator for a stored quiz: a quiz's payload never changes once
+    it is complete, so its id and creation time identify the bytes.
+    """
+    return f'"q{quiz_id}-{int(created_at.replace(tzinfo=timezone.utc).timestamp() * 1_000_000):x}"'
+
+def content_etag(*parts):
+    h = xxhash.xxh3_64()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b"\0")
+    return f'"{h.hexdigest()}"'
+
+def encoded_etag(etag, encoding):
+    """
+    The ETag of the encoding-compressed form of a response: strong ETags
+    name exact bytes, so each content coding gets its own.
+    """
+    return f'{etag[:-1]}-{encoding}"'
+
+def _base_etag(tag):
+    tag = tag.strip().removeprefix("W/")
+    for encoding in ENCODERS:
+        suffix = f'-{encoding}"'
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+def not_modified(request: Request, etag, last_modified=None):
+    """
+    True when the request's validators still match: If-None-Match (weak
+    comparison, as RFC 9110 asks for GET, ignoring the coding suffix from
+    encoded_etag) or, without it, If-Modified-Since.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {_base_etag(tag) for tag in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+def cache_headers(etag, last_modified=None, cache_control="no-cache"):
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+def not_modified_response(headers):
+    count_cache("http", "not_modified")
+    return Response(status_code=304, headers=headers)
+
+def cached_response(request: Request, content, etag, last_modified=None, cache_control="no-cache",
+                    media_type="application/json"):
+    """
+    content (bytes) with ETag, Last-Modified and Cache-Control headers, or an
+    empty 304 if the client's copy is current. Pass a callable as content to
+    only produce the body when it is actually sent.
+    """
+    headers = cache_headers(etag, last_modified, cache_control)
+    if not_modified(request, etag, last_modified):
+        return not_modified_response(headers)
+    count_cache("http", "full")
+    return Response(content=content() if callable(content) else content, media_type=media_type, headers=headers)
+
+def negotiate(accept_encoding):
+    """
+    The content coding to use for an Accept-Encoding header, or None. Among
+    codings the client rates equally, zstd beats br beats gzip.
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name.strip().lower()] = q
+    best = None
+    for encoding in ENCODERS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > 0 and (best is None or q > best[1]):
+            best = (encoding, q)
+    return best[0] if best else None
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware compressing complete response bodies of at least
+    minimum_size bytes with the best coding the client accepts (zstd, br,
+    gzip). Streaming responses pass through untouched so their chunks are
+    not held back. A body with a strong ETag is compressed once per coding,
+    and sent with that coding's ETag (see encoded_etag); a 304 answering a
+    validator for a compressed form carries the same one.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_BYTES, cache_size=COMPRESSION_CACHE_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compressed = TTLCache(maxsize=cache_size, ttl=86400)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_headers = Headers(scope=scope)
+        encoding = negotiate(request_headers.get("accept-encoding"))
+        start = None
+
+        async def send_wrapper(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                etag = headers.get("etag")
+                if message["status"] == 304:
+                    # No body, so no content type to go by
+                    if etag and encoding and encoded_etag(etag, encoding) in request_headers.get("if-none-match", ""):
+                        headers["ETag"] = encoded_etag(etag, encoding)
+                    headers.add_vary_header("Accept-Encoding")
+                    await send(message)
+                    return
+                content_type = headers.get("content-type", "")
+                if "content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES):
+                    await send(message)
+                    return
+                headers.add_vary_header("Accept-Encoding")
+                if encoding is None or message["status"] != 200:
+                    await send(message)
+                    return
+                start = message
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            held, start = start, None
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streaming, or too small to be worth it
+                await send(held)
+                await send(message)
+                return
+            headers = MutableHeaders(raw=held["headers"])
+            etag = headers.get("etag")
+            key = (etag, encoding) if etag and not etag.startswith("W/") else None
+            compressed = self.compressed.get(key) if key else None
+            if compressed is None:
+                compressed = ENCODERS[encoding](body)
+                if key:
+                    self.compressed.set(key, compressed)
+                    count_cache("compression", "miss")
+            else:
+                count_cache("compression", "hit")
+            headers["Content-Encoding"] = encoding
+            if key:
+                headers["ETag"] = encoded_etag(etag, encoding)
+            headers["Content-Length"] = str(len(compressed))
+            await send(held)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
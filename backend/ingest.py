@@ -0,0 +1,69 @@
+"""
+Bulk-generate quizzes for a list of Wikipedia URLs.
+
+Usage (from backend/):
+    python ingest.py ../sample_data/urls.json
+    python ingest.py urls.txt --scrape-concurrency 16 --llm-concurrency 4
+    python ingest.py https://en.wikipedia.org/wiki/Alan_Turing https://en.wikipedia.org/wiki/Enigma_machine
+
+Sources may be JSON files holding a list of URLs, text files with one URL
+per line, or URLs given directly. URLs that already have a quiz are
+skipped, so re-running the same command resumes an interrupted run.
+"""
+import argparse
+import asyncio
+import json
+import os
+from database import init_db_async, async_engine
+from observability import setup_logging
+from scraper import close_http_client
+from bulk import ingest_urls, BULK_SCRAPE_CONCURRENCY, BULK_LLM_CONCURRENCY, BULK_COMMIT_BATCH
+
+def read_urls(sources):
+    urls = []
+    for source in sources:
+        if not os.path.isfile(source):
+            urls.append(source)
+            continue
+        with open(source, encoding="utf-8") as f:
+            if source.endswith(".json"):
+                urls.extend(json.load(f))
+            else:
+                urls.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    return urls
+
+async def run(urls, args):
+    await init_db_async()
+    out = open(args.results, "a", encoding="utf-8") if args.results else None
+    try:
+        async for item in ingest_urls(urls, args.scrape_concurrency, args.llm_concurrency, args.batch_size, args.mode):
+            if out:
+                out.write(json.dumps(item) + "\n")
+                out.flush()
+            if item["type"] == "summary":
+                print(f"\nDone: {item['created']} created, {item['skipped']} skipped, {item['failed']} failed "
+                      f"of {item['total']} in {item['elapsed_seconds']}s ({item['urls_per_second']} URLs/s)")
+            else:
+                detail = item.get("error") or (f"article {item['article_id']}, {item['questions']} questions" if "article_id" in item else "")
+                print(f"[{item['status']:>7}] {item['url']} ({item['seconds']}s) {detail}")
+    finally:
+        if out:
+            out.close()
+        await close_http_client()
+        await async_engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="+", help="URL list files (.json or one per line) or URLs")
+    parser.add_argument("--scrape-concurrency", type=int, default=BULK_SCRAPE_CONCURRENCY)
+    parser.add_argument("--llm-concurrency", type=int, default=BULK_LLM_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=BULK_COMMIT_BATCH, help="Articles per insert transaction")
+    parser.add_argument("--mode", choices=["single", "mapreduce"], help="Generation mode (default: GENERATION_MODE)")
+    parser.add_argument("--results", help="Append per-URL results as JSON lines to this file")
+    args = parser.parse_args()
+
+    setup_logging()
+    asyncio.run(run(read_urls(args.sources), args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Seed the articles table from an offline MediaWiki XML dump.
+
+Usage (from backend/):
+    python ingest_dump.py enwiki-latest-pages-articles.xml.bz2
+    python ingest_dump.py enwiki-latest-pages-articles.xml.zst --workers 8 --batch-size 2000
+    python ingest_dump.py dump.xml.bz2 --limit 10000
+
+The dump is decompressed and parsed as a stream, so memory use stays flat
+however many pages it holds. Main-namespace pages (no redirects) have their
+wikitext stripped to the title, summary, sections and links a scrape would
+produce, and are inserted in batches. Pages whose URL is already stored are
+skipped, so re-running the same command resumes an interrupted import.
+Quizzes are not generated; use ingest.py or /generate-quiz for that.
+"""
+import argparse
+from database import init_db
+from observability import setup_logging
+from wikidump import ingest_dump, DUMP_BATCH_SIZE, DUMP_WORKERS
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dump", help="pages-articles dump: .xml, .xml.bz2 or .xml.zst")
+    parser.add_argument("--batch-size", type=int, default=DUMP_BATCH_SIZE, help="Articles per insert transaction")
+    parser.add_argument("--workers", type=int, default=DUMP_WORKERS, help="Wikitext parse processes")
+    parser.add_argument("--limit", type=int, help="Stop after this many pages")
+    args = parser.parse_args()
+
+    setup_logging()
+    init_db()
+    for item in ingest_dump(args.dump, args.batch_size, args.workers, args.limit):
+        if item["type"] == "summary":
+            print(f"\nDone: {item['inserted']} inserted, {item['skipped']} already stored, "
+                  f"{item['pages'] - item['parsed']} empty of {item['pages']} pages "
+                  f"in {item['elapsed_seconds']}s ({item['pages_per_second']} pages/s)")
+        else:
+            print(f"{item['pages']:>10} pages   {item['inserted']:>10} inserted   {item['pages_per_second']:>8} pages/s")
+
+if __name__ == "__main__":
+    main()
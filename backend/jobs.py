@@ -0,0 +1,204 @@
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from database import AsyncSessionLocal, Job
+
+# Worker pool and queue limits for background generation
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "100"))
+# Owners refresh heartbeat_at this often; jobs silent for 3 intervals are adopted
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "10"))
+# SSE streams re-read the job row this often (covers jobs run by other workers)
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "2"))
+
+TERMINAL_STATES = {"done", "failed"}
+
+log = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    pass
+
+def job_to_dict(job):
+    return {
+        "id": job.id,
+        "url": job.url,
+        "status": job.status,
+        "article_id": job.article_id,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+async def _load(job_id):
+    async with AsyncSessionLocal() as db:
+        job = await db.get(Job, job_id)
+        return job_to_dict(job) if job else None
+
+async def _create(url):
+    async with AsyncSessionLocal() as db:
+        job = Job(id=str(uuid.uuid4()), url=url, status="queued")
+        db.add(job)
+        await db.commit()
+        return job_to_dict(job)
+
+async def _update(job_id, **fields):
+    async with AsyncSessionLocal() as db:
+        now = datetime.utcnow()
+        await db.execute(update(Job).where(Job.id == job_id).values(dict(fields, updated_at=now, heartbeat_at=now)))
+        await db.commit()
+        job = await db.get(Job, job_id, populate_existing=True)
+        return job_to_dict(job) if job else None
+
+async def _heartbeat(job_ids):
+    if not job_ids:
+        return
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(Job).where(Job.id.in_(job_ids)).values(heartbeat_at=datetime.utcnow()))
+        await db.commit()
+
+async def _adopt_orphans():
+    """
+    Takes over non-terminal jobs whose owner stopped heartbeating (crash or
+    restart). The conditional UPDATE lets exactly one process adopt each job.
+    """
+    async with AsyncSessionLocal() as db:
+        cutoff = datetime.utcnow() - timedelta(seconds=3 * JOB_HEARTBEAT_SECONDS)
+        candidates = (await db.execute(select(Job.id).where(
+            Job.status.notin_(TERMINAL_STATES),
+            Job.heartbeat_at < cutoff
+        ).order_by(Job.created_at))).scalars().all()
+        adopted = []
+        for job_id in candidates:
+            now = datetime.utcnow()
+            taken = await db.execute(update(Job).where(Job.id == job_id, Job.heartbeat_at < cutoff).values(
+                status="queued", heartbeat_at=now, updated_at=now))
+            await db.commit()
+            if taken.rowcount:
+                adopted.append(job_id)
+        return adopted
+
+class JobQueue:
+    """
+    Bounded pool of asyncio workers that run quiz generation in the
+    background. Jobs are persisted in the jobs table; progress is pushed to
+    in-process subscribers (SSE streams) as each stage starts.
+
+    runner(url, report) does the actual work: it awaits report(stage) as it
+    moves through the pipeline and returns the quiz response dict.
+    """
+
+    def __init__(self, runner, concurrency=JOB_CONCURRENCY, max_depth=JOB_QUEUE_DEPTH):
+        self.runner = runner
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self._queue = asyncio.Queue()
+        self._owned = set()
+        self._subscribers = {}
+        self._tasks = []
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._maintain()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def depth(self):
+        return self._queue.qsize()
+
+    async def submit(self, url):
+        if self._queue.qsize() >= self.max_depth:
+            raise QueueFull(f"Job queue is full ({self.max_depth} waiting).")
+        job = await _create(url)
+        self._enqueue(job["id"], url)
+        return job
+
+    async def get(self, job_id):
+        return await _load(job_id)
+
+    def _enqueue(self, job_id, url):
+        self._owned.add(job_id)
+        self._queue.put_nowait((job_id, url))
+
+    async def _worker(self):
+        while True:
+            job_id, url = await self._queue.get()
+            try:
+                await self._run(job_id, url)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Recording the outcome failed (e.g. the database dropped out).
+                # Keep the worker; once the job is no longer owned its
+                # heartbeat lapses and _adopt_orphans runs it again.
+                log.exception("Job %s could not be recorded", job_id)
+            finally:
+                self._owned.discard(job_id)
+                self._queue.task_done()
+
+    async def _run(self, job_id, url):
+        async def report(stage):
+            await self._set(job_id, status=stage)
+
+        try:
+            result = await self.runner(url, report)
+            await self._set(job_id, status="done", article_id=result["id"], error=None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            log.warning("Job %s failed: %s", job_id, detail)
+            await self._set(job_id, status="failed", error=detail)
+
+    async def _set(self, job_id, **fields):
+        job = await _update(job_id, **fields)
+        if job:
+            for queue in self._subscribers.get(job_id, ()):
+                queue.put_nowait(job)
+
+    async def _maintain(self):
+        while True:
+            try:
+                await _heartbeat(list(self._owned))
+                for job_id in await _adopt_orphans():
+                    job = await _load(job_id)
+                    log.info("Adopting orphaned job %s", job_id)
+                    self._enqueue(job_id, job["url"])
+            except Exception as e:
+                log.error("Job maintenance failed: %s", e)
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+
+    async def events(self, job_id):
+        """
+        Async generator of Server-Sent Events for one job, ending once the
+        job reaches a terminal state.
+        """
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        try:
+            job = await self.get(job_id)
+            last = None
+            while job:
+                if job != last:
+                    yield f"event: status\ndata: {json.dumps(job)}\n\n"
+                    last = job
+                if job["status"] in TERMINAL_STATES:
+                    return
+                try:
+                    job = await asyncio.wait_for(queue.get(), timeout=JOB_EVENTS_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    job = await self.get(job_id)
+        finally:
+            listeners = self._subscribers.get(job_id)
+            if listeners is not None:
+                listeners.discard(queue)
+                if not listeners:
+                    del self._subscribers[job_id]
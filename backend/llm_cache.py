@@ -0,0 +1,169 @@
+import logging
+import re
+import threading
+from datetime import datetime
+import xxhash
+from sqlalchemy.exc import IntegrityError
+from database import SessionLocal, GeneratedQuiz
+from llm_providers import LLM_PROVIDER
+from observability import span, count_cache, ERRORS
+from compressor import compress_article, PROMPT_COMPRESSION, PROMPT_TOKEN_BUDGET
+from generator import generate_quiz, generate_quiz_stream, generate_quiz_sections, GENERATION_MODE, MODEL_NAME, PROMPT_VERSION
+
+# Prompt and model both shape the output; changing either invalidates old entries.
+# Non-Gemini providers (the offline fake) get their own namespace.
+CACHE_VERSION = f"{PROMPT_VERSION}:{MODEL_NAME}" if LLM_PROVIDER == "gemini" else f"{PROMPT_VERSION}:{LLM_PROVIDER}"
+
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "stores": 0}
+
+def normalize_text(text):
+    """
+    Collapses whitespace so cosmetic differences between scrapes hash the same.
+    """
+    return re.sub(r"\s+", " ", text or "").strip()
+
+def content_key(title, full_text, version=None):
+    """
+    Cache key for one article: xxh3-128 of the version tag, title and normalized text.
+    """
+    h = xxhash.xxh3_128()
+    for part in (version or CACHE_VERSION, normalize_text(title), normalize_text(full_text)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+log = logging.getLogger(__name__)
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+def lookup(key):
+    """
+    Returns the cached {"quiz", "related_topics"} for key, or None.
+    """
+    db = SessionLocal()
+    try:
+        entry = db.get(GeneratedQuiz, key)
+        if entry is None:
+            _count("misses")
+            count_cache("generation", "miss")
+            return None
+        entry.hits = (entry.hits or 0) + 1
+        entry.last_hit_at = datetime.utcnow()
+        with span("db_commit", "generation_cache_hit"):
+            db.commit()
+        _count("hits")
+        count_cache("generation", "hit")
+        return entry.result
+    finally:
+        db.close()
+
+def store(key, result):
+    db = SessionLocal()
+    try:
+        db.add(GeneratedQuiz(
+            content_key=key,
+            prompt_version=CACHE_VERSION,
+            result={"quiz": result["quiz"], "related_topics": result.get("related_topics", [])}
+        ))
+        with span("db_commit", "generation_cache_store"):
+            db.commit()
+        _count("stores")
+    except IntegrityError:
+        # Another worker stored the same content first
+        db.rollback()
+    finally:
+        db.close()
+
+def section_text(section_texts):
+    return "\n\n".join(s["title"] + "\n\n" + "\n\n".join(s["paragraphs"]) for s in section_texts)
+
+def single_prompt_input(title, full_text, section_texts):
+    """
+    Cache key and a callable producing the article text for the single-prompt
+    path. With PROMPT_COMPRESSION on, the whole article is compressed to the
+    token budget (lazily, so cache hits skip the work).
+    """
+    if not PROMPT_COMPRESSION:
+        return content_key(title, full_text), lambda: full_text
+    source = section_text(section_texts) if section_texts else full_text
+    key = content_key(title, source, version=f"{CACHE_VERSION}:compressed{PROMPT_TOKEN_BUDGET}")
+    return key, lambda: compress_article(full_text, section_texts)[0]
+
+def cached_generate_quiz(title, full_text, section_texts=None, mode=None):
+    """
+    generate_quiz with a content-addressed cache in front of it.
+    Identical article text skips the LLM call entirely. In "mapreduce" mode
+    the whole sectioned article is generated in parallel chunks instead.
+    """
+    mapreduce = (mode or GENERATION_MODE) == "mapreduce"
+    if mapreduce and not section_texts:
+        # Scrape with whole_article=True for map-reduce; never fall back quietly
+        return {"error": "Map-reduce generation needs section text, and none was extracted."}
+    if mapreduce:
+        key = content_key(title, section_text(section_texts), version=CACHE_VERSION + ":mapreduce")
+    else:
+        key, article_text = single_prompt_input(title, full_text, section_texts)
+    try:
+        cached = lookup(key)
+    except Exception as e:
+        log.warning("Generation cache lookup failed: %s", e)
+        ERRORS.labels("generation_cache").inc()
+        cached = None
+    if cached:
+        log.info("Generation cache hit (%s); skipping LLM call", key[:12])
+        return cached
+
+    if mapreduce:
+        result = generate_quiz_sections(title, section_texts)
+    else:
+        result = generate_quiz(title, article_text())
+    if result and "error" not in result and result.get("quiz"):
+        try:
+            store(key, result)
+        except Exception as e:
+            log.warning("Generation cache store failed: %s", e)
+    return result
+
+def cached_generate_quiz_stream(title, full_text, section_texts=None):
+    """
+    generate_quiz_stream with the same cache: a hit replays the stored
+    questions, a miss streams from the model and stores the result at the end.
+    """
+    key, article_text = single_prompt_input(title, full_text, section_texts)
+    try:
+        cached = lookup(key)
+    except Exception as e:
+        log.warning("Generation cache lookup failed: %s", e)
+        ERRORS.labels("generation_cache").inc()
+        cached = None
+    if cached:
+        log.info("Generation cache hit (%s); skipping LLM call", key[:12])
+        for question in cached["quiz"]:
+            yield "question", question
+        yield "related_topics", cached["related_topics"]
+        return
+
+    questions = []
+    for kind, payload in generate_quiz_stream(title, article_text()):
+        if kind == "question":
+            questions.append(payload)
+        else:
+            try:
+                store(key, {"quiz": questions, "related_topics": payload})
+            except Exception as e:
+                log.warning("Generation cache store failed: %s", e)
+        yield kind, payload
+
+def generation_cache_stats():
+    with _lock:
+        counters = dict(_counters)
+    lookups = counters["hits"] + counters["misses"]
+    return dict(
+        counters,
+        version=CACHE_VERSION,
+        saved_calls=counters["hits"],
+        hit_rate=round(counters["hits"] / lookups, 4) if lookups else 0.0,
+    )
@@ -0,0 +1,303 @@
+import logging
+import os
+import threading
+import time
+from google.api_core import exceptions as google_exceptions
+from pydantic import ValidationError
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+from llm_providers import LLM_PROVIDER, make_model, provider_available
+from observability import span, LLM_CALLS, LLM_TOKENS
+
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-flash-latest")
+
+# Process-wide quota: requests per minute (with a burst allowance) and,
+# optionally, estimated input tokens per minute (0 disables the token bucket)
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_BURST = float(os.getenv("LLM_BURST", "5"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_ACQUIRE_TIMEOUT = float(os.getenv("LLM_ACQUIRE_TIMEOUT", "60"))
+# Retries with full-jitter exponential backoff on transient provider errors
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "4"))
+LLM_RETRY_MAX_WAIT = float(os.getenv("LLM_RETRY_MAX_WAIT", "20"))
+# Circuit breaker: open after this many consecutive failures, probe again after the cooldown
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+CHARS_PER_TOKEN = 4
+
+log = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,   # 429
+    google_exceptions.ServiceUnavailable,  # 503
+    google_exceptions.InternalServerError, # 500
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.GatewayTimeout,
+    ConnectionError,
+    TimeoutError,
+)
+
+class LLMError(Exception):
+    """
+    Base class for LLM failures. `status` is the HTTP status the API should return.
+    """
+    status = 500
+
+class LLMUnavailable(LLMError):
+    status = 503
+
+class CircuitOpenError(LLMUnavailable):
+    pass
+
+class RateLimitTimeout(LLMUnavailable):
+    pass
+
+class LLMResponseError(LLMError):
+    """
+    The model answered but the output did not match the schema (not retried).
+    """
+    status = 502
+
+def is_retryable(error):
+    return isinstance(error, RETRYABLE_ERRORS)
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. acquire() blocks until enough tokens are
+    available or the timeout passes.
+    """
+
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1.0, timeout=LLM_ACQUIRE_TIMEOUT):
+        amount = min(amount, self.capacity)
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            if now + wait > deadline:
+                raise RateLimitTimeout("LLM rate limit: no capacity within the wait limit, try again shortly.")
+            self.waited += wait
+            time.sleep(wait)
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and rejects calls for
+    `cooldown` seconds, then lets a single probe through (half-open).
+    """
+
+    def __init__(self, threshold=LLM_BREAKER_THRESHOLD, cooldown=LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half_open" and self.probing):
+                raise CircuitOpenError("AI provider is unavailable (circuit open), try again shortly.")
+            if state == "half_open":
+                self.probing = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.probing = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    self.trips += 1
+                self.opened_at = time.monotonic()
+
+class LLMClient:
+    """
+    Long-lived LLM client shared by all requests: configured once, with a
+    process-wide rate limiter, retries on transient errors and a circuit
+    breaker. Structured calls constrain output to a pydantic schema and
+    validate it, so malformed JSON is reported instead of retried. The model
+    itself comes from LLM_PROVIDER (Gemini, or the offline fake).
+    """
+
+    def __init__(self, model_name=MODEL_NAME, provider=LLM_PROVIDER):
+        self.model_name = model_name
+        self.provider = provider
+        self.requests = TokenBucket(LLM_REQUESTS_PER_MINUTE / 60.0, LLM_BURST)
+        self.tokens = TokenBucket(LLM_TOKENS_PER_MINUTE / 60.0, LLM_TOKENS_PER_MINUTE) if LLM_TOKENS_PER_MINUTE else None
+        self.breaker = CircuitBreaker()
+        self.counters = {"calls": 0, "retries": 0, "failures": 0, "invalid_responses": 0}
+        self._model = None
+        self._lock = threading.Lock()
+
+    def available(self):
+        return provider_available(self.provider)
+
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                self._model = make_model(self.model_name, self.provider)
+            return self._model
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _call(self, prompt, fn):
+        """
+        Runs fn() under the limiter and breaker, retrying transient errors.
+        """
+        def before_sleep(state):
+            self._count("retries")
+            log.warning("LLM call failed (%r); retry %d/%d", state.outcome.exception(), state.attempt_number, LLM_MAX_ATTEMPTS - 1)
+
+        def attempt():
+            self.requests.acquire()
+            if self.tokens:
+                self.tokens.acquire(len(prompt) / CHARS_PER_TOKEN)
+            self.breaker.before_call()
+            self._count("calls")
+            try:
+                with span("llm_call"):
+                    result = fn()
+            except Exception as e:
+                if is_retryable(e):
+                    self.breaker.record_failure()
+                    self._count("failures")
+                    LLM_CALLS.labels("retryable_error").inc()
+                else:
+                    # The provider answered; only outages count against the breaker
+                    self.breaker.record_success()
+                    LLM_CALLS.labels("error").inc()
+                raise
+            self.breaker.record_success()
+            LLM_CALLS.labels("ok").inc()
+            return result
+
+        retrying = Retrying(
+            stop=stop_after_attempt(LLM_MAX_ATTEMPTS),
+            wait=wait_random_exponential(multiplier=1, max=LLM_RETRY_MAX_WAIT),
+            retry=retry_if_exception(is_retryable),
+            before_sleep=before_sleep,
+            reraise=True,
+        )
+        try:
+            return retrying(attempt)
+        except RETRYABLE_ERRORS as e:
+            raise LLMUnavailable(f"AI provider error after {LLM_MAX_ATTEMPTS} attempts: {e}") from e
+
+    def _config(self, schema):
+        if schema is None:
+            return None
+        return {"response_mime_type": "application/json", "response_schema": schema}
+
+    def _record_tokens(self, prompt, response, output_chars):
+        """
+        Counts tokens from the provider's usage metadata, estimating from
+        characters when it has none (e.g. the fake provider).
+        """
+        usage = getattr(response, "usage_metadata", None)
+        LLM_TOKENS.labels("input").inc(getattr(usage, "prompt_token_count", 0) or len(prompt) / CHARS_PER_TOKEN)
+        LLM_TOKENS.labels("output").inc(getattr(usage, "candidates_token_count", 0) or output_chars / CHARS_PER_TOKEN)
+
+    def generate_structured(self, prompt, schema):
+        """
+        Returns the model's answer parsed and validated as a `schema` instance.
+        """
+        response = self._call(prompt, lambda: self.model().generate_content(
+            prompt, generation_config=self._config(schema), request_options={"timeout": LLM_TIMEOUT}
+        ))
+        text = response.text
+        self._record_tokens(prompt, response, len(text))
+        try:
+            with span("json_parse"):
+                return schema.model_validate_json(text)
+        except (ValidationError, ValueError) as e:
+            self._count("invalid_responses")
+            raise LLMResponseError(f"AI response did not match the quiz schema: {e}") from e
+
+    def stream(self, prompt, schema=None):
+        """
+        Yields text chunks of a streamed answer. Only opening the stream is
+        retried; errors after the first chunk are raised to the caller.
+        """
+        def open_stream():
+            # Pull the first chunk inside the retried call: that is where
+            # quota and availability errors surface
+            chunks = iter(self.model().generate_content(
+                prompt, generation_config=self._config(schema), stream=True,
+                request_options={"timeout": LLM_TIMEOUT}
+            ))
+            return next(chunks, None), chunks
+
+        first, chunks = self._call(prompt, open_stream)
+        if first is None:
+            return
+        last = first
+        output_chars = 0
+        try:
+            output_chars += len(first.text)
+            yield first.text
+            for chunk in chunks:
+                last = chunk
+                output_chars += len(chunk.text)
+                yield chunk.text
+        except RETRYABLE_ERRORS as e:
+            self.breaker.record_failure()
+            self._count("failures")
+            raise LLMUnavailable(f"AI provider error while streaming: {e}") from e
+        # The final chunk carries usage metadata for the whole answer
+        self._record_tokens(prompt, last, output_chars)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return dict(
+            counters,
+            model=self.model_name,
+            provider=self.provider,
+            breaker=self.breaker.state,
+            breaker_trips=self.breaker.trips,
+            rate_limit_wait_seconds=round(self.requests.waited + (self.tokens.waited if self.tokens else 0), 3),
+        )
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Returns the process-wide LLMClient, creating it on first use.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
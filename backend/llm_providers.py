@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from collections import Counter
+import google.generativeai as genai
+from compressor import split_sentences, STOPWORDS
+
+# Which model answers LLMClient calls: "gemini" (default) or "fake", a
+# deterministic offline stand-in for tests and load tests
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+# Fake provider: seconds per call, +/- a jitter fraction derived from the prompt
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "1.0"))
+FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", "0.2"))
+FAKE_STREAM_CHUNKS = 8
+
+TITLE = re.compile(r'article (?:content about )?"([^"]+)"')
+SECTIONS = re.compile(r"covering the sections (.+?)\.\s*$", re.M)
+COUNT = re.compile(r"Generate (\d+) questions")
+CONTENT = re.compile(r"Article Content:\s*(.*?)\n\s*Return ", re.S)
+TERM = re.compile(r"[A-Za-z][A-Za-z-]{4,}")
+NAME = re.compile(r"\b[A-Z][a-z]+(?: [A-Z][a-z]+)*")
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+def _seed(prompt):
+    return int.from_bytes(hashlib.sha256(prompt.encode()).digest()[:8], "big")
+
+def fake_quiz(prompt):
+    """
+    Builds a schema-valid quiz from the article text inside the prompt:
+    fill-in-the-blank questions over its sentences, with distractors drawn
+    from the article's vocabulary. The same prompt always gives the same quiz.
+    """
+    rng = random.Random(_seed(prompt))
+    match = TITLE.search(prompt)
+    title = match.group(1) if match else "the article"
+    match = SECTIONS.search(prompt)
+    sections = re.findall(r'"([^"]+)"', match.group(1)) if match else ["General"]
+    match = COUNT.search(prompt)
+    n_questions = int(match.group(1)) if match else 6
+    match = CONTENT.search(prompt)
+    content = match.group(1) if match else prompt
+    sentences = [s for s in split_sentences(" ".join(content.split())) if len(s.split()) >= 6]
+    vocabulary = sorted({w for w in TERM.findall(content) if w.lower() not in STOPWORDS})
+
+    quiz = []
+    for i in range(min(n_questions, len(sentences))):
+        sentence = sentences[(i * 7) % len(sentences)]
+        terms = [w for w in TERM.findall(sentence) if w.lower() not in STOPWORDS]
+        if not terms:
+            continue
+        answer = max(terms, key=len)
+        others = [w for w in vocabulary if w not in terms]
+        distractors = rng.sample(others, 3) if len(others) >= 3 else [f"{answer} {k}" for k in ("I", "II", "III")]
+        options = [answer] + distractors
+        rng.shuffle(options)
+        quiz.append({
+            "question": f"Which word completes the statement about {title}: \"{sentence.replace(answer, '_____', 1)}\"",
+            "options": options,
+            "answer": answer,
+            "difficulty": ("easy", "medium", "hard")[i % 3],
+            "explanation": f"The article states: \"{sentence[:300]}\"",
+            "section": sections[i % len(sections)],
+        })
+
+    names = Counter(n for n in NAME.findall(content) if n != title and n.lower() not in STOPWORDS and len(n) > 3)
+    related = [n for n, _ in sorted(names.items(), key=lambda item: (-item[1], item[0]))[:3]]
+    return {"quiz": quiz, "related_topics": related}
+
+class FakeModel:
+    """
+    Offline stand-in for genai.GenerativeModel: same generate_content call,
+    deterministic answers, and a configurable latency so load tests see
+    realistic LLM-bound request times.
+    """
+
+    def __init__(self, latency=FAKE_LLM_LATENCY, jitter=FAKE_LLM_JITTER):
+        self.latency = latency
+        self.jitter = jitter
+
+    def delay(self, prompt):
+        spread = (_seed(prompt) % 1000) / 999.0 * 2 - 1
+        return max(0.0, self.latency * (1 + self.jitter * spread))
+
+    def generate_content(self, prompt, generation_config=None, stream=False, request_options=None):
+        text = json.dumps(fake_quiz(prompt))
+        if stream:
+            return self._stream(text, self.delay(prompt))
+        time.sleep(self.delay(prompt))
+        return FakeResponse(text)
+
+    def _stream(self, text, delay):
+        size = -(-len(text) // FAKE_STREAM_CHUNKS)
+        for start in range(0, len(text), size):
+            time.sleep(delay / FAKE_STREAM_CHUNKS)
+            yield FakeResponse(text[start:start + size])
+
+def provider_available(provider=LLM_PROVIDER):
+    if provider == "fake":
+        return True
+    return bool(os.getenv("GOOGLE_API_KEY"))
+
+def make_model(model_name, provider=LLM_PROVIDER):
+    """
+    Creates the model object LLMClient calls generate_content on.
+    """
+    if provider == "fake":
+        return FakeModel()
+    if provider == "gemini":
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        return genai.GenerativeModel(model_name)
+    raise ValueError(f"Unknown LLM_PROVIDER {provider!r} (expected 'gemini' or 'fake')")
@@ -1,13 +1,88 @@
-from fastapi import FastAPI, HTTPException, Depends
+import asyncio
+import base64
+import json
+import logging
+import random
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List, Literal, Optional
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from database import get_db, init_db, WikiArticle, Quiz, Question
-from scraper import scrape_wikipedia
-from generator import generate_quiz
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from sqlalchemy import select, func, or_, and_, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from pydantic import BaseModel, Field
+import orjson
+from database import get_db, init_db_async, async_engine, AsyncSessionLocal, WikiArticle, Quiz, Question, claim_generation, hold_generation, release_generation, quiz_response
+from scraper import scrape_wikipedia_async, close_http_client, normalize_url, scrape_cache_stats
+from compressor import compression_stats
+from entities import get_gazetteer, gazetteer_stats
+from llm_client import get_client
+from llm_cache import cached_generate_quiz, cached_generate_quiz_stream, generation_cache_stats
+from blobstore import put_html_async, get_article_html
+from bulk import ingest_urls, BULK_SCRAPE_CONCURRENCY, BULK_LLM_CONCURRENCY
+from singleflight import SingleFlight
+from jobs import JobQueue, QueueFull
+from search import search, SearchUnavailable
+from questionbank import question_bank, assemble, parse_mix
+from refresh import refresh_loop, refresh_stats, REFRESH_INTERVAL_SECONDS
+from httpcache import (
+    cached_response, cache_headers, content_etag, quiz_etag, not_modified, not_modified_response, CompressionMiddleware
+)
+from observability import setup_logging, span, count_cache, metrics_response, MetricsMiddleware, ERRORS
+import os
+import anyio
 import uvicorn
 
-app = FastAPI(title="Wikipedia Quiz Generator API")
+# How often a request waiting on another worker's generation re-checks the claim
+CLAIM_POLL_SECONDS = float(os.getenv("GENERATION_CLAIM_POLL_SECONDS", "1"))
+
+# Page sizes for the /quizzes history listing
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "100"))
+# Page sizes for /search
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+SEARCH_MAX_PAGE_SIZE = int(os.getenv("SEARCH_MAX_PAGE_SIZE", "100"))
+# Question counts for /quiz/{id}/variant
+QUIZ_VARIANT_SIZE = int(os.getenv("QUIZ_VARIANT_SIZE", "10"))
+QUIZ_VARIANT_MAX_SIZE = int(os.getenv("QUIZ_VARIANT_MAX_SIZE", "50"))
+# Seconds browsers and CDNs may reuse a stored quiz (or an article preview)
+# before revalidating with its ETag
+QUIZ_CACHE_MAX_AGE = int(os.getenv("QUIZ_CACHE_MAX_AGE", "60"))
+PREVIEW_CACHE_MAX_AGE = int(os.getenv("PREVIEW_CACHE_MAX_AGE", "300"))
+
+setup_logging()
+log = logging.getLogger(__name__)
 
+generation_flights = SingleFlight()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create missing tables and columns once, before serving any request
+    try:
+        await init_db_async()
+    except Exception as e:
+        log.error("Database initialisation failed: %s", e)
+    # Compile (or load the cached) entity automaton now rather than on the first scrape
+    await run_in_threadpool(get_gazetteer)
+    await job_queue.start()
+    # Optional scheduled revision check of stored articles (see refresh.py)
+    refresher = asyncio.create_task(refresh_loop()) if REFRESH_INTERVAL_SECONDS > 0 else None
+    yield
+    if refresher:
+        refresher.cancel()
+    await job_queue.stop()
+    # Release pooled keep-alive and database connections on shutdown
+    await close_http_client()
+    await async_engine.dispose()
+
+app = FastAPI(title="Wikipedia Quiz Generator API", lifespan=lifespan)
+
+# zstd/br/gzip for larger JSON bodies; added first so it sits inside the other middleware
+app.add_middleware(CompressionMiddleware)
 # Enable CORS for frontend
 app.add_middleware(
     CORSMiddleware,
@@ -16,198 +91,654 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Request latency histogram by route, exposed at /metrics
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/preview-article")
-async def preview_article(url: str):
+async def preview_article(url: str, request: Request):
     """
     Fast endpoint to fetch just the title and summary for a preview.
     """
-    print(f"Preview Request for: {url}")
-    data = scrape_wikipedia(url)
+    log.info("Preview request for %s", url)
+    data = await scrape_wikipedia_async(url)
     if not data:
         raise HTTPException(status_code=400, detail="Could not preview article. Check the URL.")
-    
-    return {
-        "title": data["title"],
-        "summary": data["summary"]
-    }
 
-@app.post("/generate-quiz")
-async def create_quiz(url: str, db: Session = Depends(get_db)):
-    print(f"\n--- New Quiz Request for URL: {url} ---")
-    
-    # Check if article already exists
-    article_to_use = None
+    return cached_response(
+        request,
+        lambda: orjson.dumps({"title": data["title"], "summary": data["summary"]}),
+        etag=content_etag(data["title"], data["summary"]),
+        cache_control=f"public, max-age={PREVIEW_CACHE_MAX_AGE}"
+    )
+
+async def build_payload(db: AsyncSession, quiz_id: int):
+    """
+    Serializes a quiz written before payloads existed and stores the result.
+    The article is joined in; questions follow in one IN query.
+    """
+    quiz = (await db.execute(select(Quiz).options(
+        joinedload(Quiz.article), selectinload(Quiz.questions)
+    ).where(Quiz.id == quiz_id))).scalar()
+    if not quiz or not quiz.questions:
+        return None
+    questions = [
+        {
+            "question": q.question_text,
+            "options": q.options,
+            "answer": q.answer,
+            "difficulty": q.difficulty,
+            "explanation": q.explanation,
+            "section": q.section
+        } for q in quiz.questions
+    ]
+    payload = orjson.dumps(quiz_response(quiz.article, questions, quiz.related_topics))
+    quiz.payload = payload
+    await db.commit()
+    return payload
+
+async def latest_quiz_payload(db: AsyncSession, *criteria):
+    """
+    Pre-serialized response for the latest complete quiz of the article
+    matching criteria, or None. One indexed lookup on the hot path.
+    """
+    row = (await db.execute(select(Quiz.id, Quiz.payload).join(WikiArticle, Quiz.article_id == WikiArticle.id).where(
+        *criteria, Quiz.status == "complete"
+    ).order_by(Quiz.created_at.desc()).limit(1))).first()
+    if row is None:
+        return None
+    if row.payload is None:
+        return await build_payload(db, row.id)
+    return row.payload
+
+async def find_existing_quiz(db: AsyncSession, url: str):
+    """
+    Looks up a stored article and its latest quiz.
+    Returns (article, cached_response); either may be None.
+    """
+    existing_article = (await db.execute(select(WikiArticle).where(WikiArticle.url == url))).scalar()
+    if existing_article:
+        log.debug("Article found in DB: ID %s", existing_article.id)
+
+        # Check if it has a quiz with questions
+        payload = await latest_quiz_payload(db, WikiArticle.id == existing_article.id)
+        if payload:
+            log.info("Existing quiz found for article %s", existing_article.id)
+            return existing_article, orjson.loads(payload)
+
+    # A scrape and an LLM call come next: end the read transaction so the
+    # session does not hold a pooled connection while they run
+    await db.commit()
+    return existing_article, None
+
+async def save_article(db: AsyncSession, scraped_data: dict):
+    new_article = WikiArticle(
+        url=scraped_data["url"],
+        title=scraped_data["title"],
+        summary=scraped_data["summary"],
+        sections=scraped_data["sections"],
+        key_entities=scraped_data["key_entities"],
+        raw_html_hash=await put_html_async(db, scraped_data["raw_html"]),
+        revision_id=scraped_data.get("revision_id"),
+        content_hash=scraped_data.get("content_hash"),
+        checked_at=datetime.utcnow()
+    )
+    db.add(new_article)
+    with span("db_commit", "save_article"):
+        await db.commit()
+    return new_article
+
+async def save_quiz(db: AsyncSession, article: WikiArticle, ai_generated: dict):
+    """
+    Stores the quiz, its questions and the serialized response in one transaction.
+    """
+    response = quiz_response(article, ai_generated["quiz"], ai_generated["related_topics"])
+    new_quiz = Quiz(
+        article_id=article.id,
+        related_topics=ai_generated["related_topics"],
+        payload=orjson.dumps(response)
+    )
+    db.add(new_quiz)
+    await db.flush()
+
+    # Save Questions
+    question_objs = []
+    for q in response["quiz"]:
+        question_objs.append(Question(
+            quiz_id=new_quiz.id,
+            question_text=q["question"],
+            options=q["options"],
+            answer=q["answer"],
+            difficulty=q["difficulty"],
+            explanation=q["explanation"],
+            section=q["section"]
+        ))
+    db.add_all(question_objs)
+    with span("db_commit", "save_quiz"):
+        await db.commit()
+    question_bank.mark_stale(article.id)
+    return response
+
+async def start_streaming_quiz(db: AsyncSession, article_id: int):
+    new_quiz = Quiz(article_id=article_id, related_topics=[], status="streaming")
+    db.add(new_quiz)
+    await db.commit()
+    return new_quiz
+
+async def save_question(db: AsyncSession, quiz_id: int, q: dict):
+    db.add(Question(
+        quiz_id=quiz_id,
+        question_text=q["question"],
+        options=q["options"],
+        answer=q["answer"],
+        difficulty=q["difficulty"],
+        explanation=q["explanation"],
+        section=q.get("section", "General")
+    ))
+    with span("db_commit", "save_question"):
+        await db.commit()
+
+async def finish_streaming_quiz(db: AsyncSession, quiz: Quiz, article: WikiArticle, questions: list, related_topics: list):
+    quiz.related_topics = related_topics
+    quiz.payload = orjson.dumps(quiz_response(article, questions, related_topics))
+    quiz.status = "complete"
+    with span("db_commit", "finish_streaming_quiz"):
+        await db.commit()
+    question_bank.mark_stale(article.id)
+
+async def discard_streaming_quiz(quiz_id: int):
+    """
+    Deletes an unfinished streaming quiz and the questions saved so far, on
+    a session of its own (the stream's may have been cancelled mid-statement).
+    """
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Question).where(Question.quiz_id == quiz_id))
+        await db.execute(delete(Quiz).where(Quiz.id == quiz_id))
+        await db.commit()
+
+@asynccontextmanager
+async def generation_claim(db: AsyncSession, url: str):
+    """
+    Holds the database claim row for url's normalized key, waiting while
+    another worker holds it, so only one process generates an article at a
+    time. A heartbeat renews the claim while a long generation runs.
+    """
+    url_key = normalize_url(url)
+    while not await claim_generation(db, url_key):
+        log.info("Another worker is generating %s; waiting", url_key)
+        await asyncio.sleep(CLAIM_POLL_SECONDS)
+    heartbeat = asyncio.create_task(hold_generation(url_key))
     try:
-        print("Checking database for existing article...")
-        existing_article = db.query(WikiArticle).filter(WikiArticle.url == url).first()
-        
-        if existing_article:
-            print(f"Article found in DB: ID {existing_article.id}")
-            article_to_use = existing_article
-            
-            # Check if it has a quiz with questions
-            existing_quiz = db.query(Quiz).filter(Quiz.article_id == existing_article.id).order_by(Quiz.created_at.desc()).first()
-            if existing_quiz:
-                questions = db.query(Question).filter(Question.quiz_id == existing_quiz.id).all()
-                if len(questions) > 0:
-                    print(f"Existing quiz with {len(questions)} questions found. Returning cached data.")
-                    return {
-                        "id": existing_article.id,
-                        "url": existing_article.url,
-                        "title": existing_article.title,
-                        "summary": existing_article.summary,
-                        "key_entities": existing_article.key_entities,
-                        "sections": existing_article.sections,
-                        "quiz": [
-                            {
-                                "question": q.question_text,
-                                "options": q.options,
-                                "answer": q.answer,
-                                "difficulty": q.difficulty,
-                                "explanation": q.explanation,
-                                "section": q.section
-                            } for q in questions
-                        ],
-                        "related_topics": existing_quiz.related_topics
-                    }
-                else:
-                    print("Existing quiz found but it has no questions. Forcing re-generation.")
-    except Exception as e:
-        print(f"Database query failed: {e}")
-        # Safeguard: if tables are somehow missing, init them
-        init_db()
+        yield
+    finally:
+        heartbeat.cancel()
+        try:
+            # A failed or cancelled statement leaves the transaction unusable;
+            # shielded so a client disconnect still releases the claim
+            with anyio.CancelScope(shield=True):
+                await db.rollback()
+                await release_generation(db, url_key)
+        except Exception as e:
+            # The claim goes stale after CLAIM_TTL_SECONDS and is taken over then
+            log.warning("Could not release generation claim for %s: %s", url_key, e)
 
+async def build_quiz(url: str, report=None):
+    """
+    Scrapes, generates and stores a quiz for url using its own session.
+    A database claim row on the normalized URL keeps other workers from
+    generating the same article at the same time.
+    """
+    async with AsyncSessionLocal() as db:
+        async with generation_claim(db, url):
+            # Another worker may have finished while we waited for the claim
+            article_to_use, cached = await find_existing_quiz(db, url)
+            if cached:
+                return cached
+            return await generate_and_store(db, url, article_to_use, report)
+
+async def generate_and_store(db: AsyncSession, url: str, article_to_use, report=None):
     # Scrape Content
-    print("Scraping Wikipedia...")
-    scraped_data = scrape_wikipedia(url)
+    if report:
+        await report("scraping")
+    scraped_data = await scrape_wikipedia_async(url)
     if not scraped_data:
-        print("Scraping failed.")
+        log.warning("Scraping failed for %s", url)
         raise HTTPException(status_code=400, detail="Failed to scrape Wikipedia article.")
-    print(f"Scraping successful: {scraped_data['title']}")
+    log.debug("Scraped %r", scraped_data["title"])
 
     # Save Article (Only if it doesn't exist)
     if not article_to_use:
-        print("Saving new article to database...")
         try:
-            new_article = WikiArticle(
-                url=scraped_data["url"],
-                title=scraped_data["title"],
-                summary=scraped_data["summary"],
-                sections=scraped_data["sections"],
-                key_entities=scraped_data["key_entities"],
-                raw_html=scraped_data["raw_html"]
-            )
-            db.add(new_article)
-            db.commit()
-            db.refresh(new_article)
-            article_to_use = new_article
-            print(f"Article saved with ID: {article_to_use.id}")
+            article_to_use = await save_article(db, scraped_data)
+            log.debug("Article saved with ID %s", article_to_use.id)
         except Exception as e:
-            print(f"Database error while saving article: {e}")
-            db.rollback()
+            log.exception("Database error while saving article")
+            ERRORS.labels("database").inc()
+            await db.rollback()
             raise HTTPException(status_code=500, detail=f"Database error while saving article: {str(e)}")
     else:
-        print(f"Using existing article (ID: {article_to_use.id}) for quiz generation.")
+        log.debug("Using existing article %s for quiz generation", article_to_use.id)
 
     # Generate Quiz
-    print("Generating quiz with AI (Gemini)...")
+    if report:
+        await report("generating")
+    # Don't keep a pooled connection checked out for the length of the LLM call
+    await db.commit()
     try:
-        # We use the title and full_text from the scraper
-        ai_generated = generate_quiz(scraped_data["title"], scraped_data["full_text"])
+        # We use the title and full_text from the scraper; identical text is served from the generation cache
+        ai_generated = await run_in_threadpool(
+            cached_generate_quiz, scraped_data["title"], scraped_data["full_text"], scraped_data.get("section_texts")
+        )
         if ai_generated and "error" in ai_generated:
-            print(f"AI Generation Error: {ai_generated['error']}")
-            raise Exception(ai_generated["error"])
+            log.error("AI generation error: %s", ai_generated["error"])
+            # 503 when the provider is rate limited or down, so clients can retry later
+            raise HTTPException(status_code=ai_generated.get("status", 500), detail=f"AI Quiz Generation failed: {ai_generated['error']}")
         if not ai_generated:
-            print("AI generator returned None.")
+            log.error("AI generator returned None")
             raise Exception("AI generator returned None. Check backend logs for details.")
-        print("AI generation successful.")
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"AI generation failed: {e}")
+        log.exception("AI generation failed")
         raise HTTPException(status_code=500, detail=f"AI Quiz Generation failed: {str(e)}")
 
     # Save Quiz
-    print("Saving quiz and questions to database...")
+    if report:
+        await report("saving")
     try:
-        new_quiz = Quiz(
-            article_id=article_to_use.id,
-            related_topics=ai_generated["related_topics"]
-        )
-        db.add(new_quiz)
-        db.commit()
-        db.refresh(new_quiz)
-
-        # Save Questions
-        question_objs = []
-        for q in ai_generated["quiz"]:
-            question_objs.append(Question(
-                quiz_id=new_quiz.id,
-                question_text=q["question"],
-                options=q["options"],
-                answer=q["answer"],
-                difficulty=q["difficulty"],
-                explanation=q["explanation"],
-                section=q.get("section", "General") # Save section
-            ))
-        db.add_all(question_objs)
-        db.commit()
-        print("Quiz and questions saved successfully.")
+        response = await save_quiz(db, article_to_use, ai_generated)
+        log.info("Saved quiz with %d questions for article %s", len(response["quiz"]), response["id"])
     except Exception as e:
-        print(f"Database error while saving quiz: {e}")
-        db.rollback()
+        log.exception("Database error while saving quiz")
+        ERRORS.labels("database").inc()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error while saving quiz: {str(e)}")
 
-    return {
-        "id": article_to_use.id,
-        "url": article_to_use.url,
-        "title": article_to_use.title,
-        "summary": article_to_use.summary,
-        "key_entities": article_to_use.key_entities,
-        "sections": article_to_use.sections,
-        "quiz": ai_generated["quiz"],
-        "related_topics": ai_generated["related_topics"]
-    }
+    return response
 
-@app.get("/quizzes")
-async def list_quizzes(db: Session = Depends(get_db)):
+async def run_quiz_job(url: str, report):
+    # Background jobs share the same coalescing as synchronous requests
+    return await generation_flights.do(normalize_url(url), lambda: build_quiz(url, report))
+
+job_queue = JobQueue(runner=run_quiz_job)
+
+@app.post("/generate-quiz")
+async def create_quiz(url: str, background: bool = False, db: AsyncSession = Depends(get_db)):
+    log.info("Quiz request for %s", url)
+
+    if background:
+        # Enqueue and return immediately; poll /jobs/{id} or stream /jobs/{id}/events
+        try:
+            job = await job_queue.submit(url)
+        except QueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        job["status_url"] = f"/jobs/{job['id']}"
+        job["events_url"] = f"/jobs/{job['id']}/events"
+        return JSONResponse(status_code=202, content=job)
+    
+    # Check if article already exists (tables are created once at startup)
     try:
-        articles = db.query(WikiArticle).order_by(WikiArticle.created_at.desc()).all()
-        return articles
+        with span("db_query", "latest_quiz"):
+            payload = await latest_quiz_payload(db, WikiArticle.url == url)
+        if payload:
+            count_cache("stored_quiz", "hit")
+            log.debug("Existing quiz found; returning stored response")
+            return Response(content=payload, media_type="application/json")
+        count_cache("stored_quiz", "miss")
     except Exception as e:
-        print(f"List quizzes failed: {e}")
-        return []
+        log.error("Database query failed: %s", e)
+        ERRORS.labels("database").inc()
+    # Generation uses its own session; give this one's connection back to the pool
+    await db.close()
 
-@app.get("/quiz/{article_id}")
-async def get_quiz_details(article_id: int, db: Session = Depends(get_db)):
-    article = db.query(WikiArticle).filter(WikiArticle.id == article_id).first()
-    if not article:
-        raise HTTPException(status_code=404, detail="Article not found")
-    
-    quiz = db.query(Quiz).filter(Quiz.article_id == article.id).order_by(Quiz.created_at.desc()).first()
-    if not quiz:
-        raise HTTPException(status_code=404, detail="Quiz not found")
-    
-    questions = db.query(Question).filter(Question.quiz_id == quiz.id).all()
-    
+    # Concurrent requests for the same article share one scrape + generation
+    return await generation_flights.do(normalize_url(url), lambda: build_quiz(url))
+
+def ndjson(event: dict):
+    return json.dumps(event) + "\n"
+
+def article_event(article):
     return {
+        "type": "article",
         "id": article.id,
         "url": article.url,
         "title": article.title,
         "summary": article.summary,
         "key_entities": article.key_entities,
-        "sections": article.sections,
-        "quiz": [
+        "sections": article.sections
+    }
+
+async def stream_quiz_events(url: str):
+    """
+    Yields NDJSON lines: one "article" event, a "question" event per question
+    as soon as the model produces it, then "done" (or "error").
+    Questions are persisted one by one; the quiz is only marked complete at the end.
+    """
+    db = AsyncSessionLocal()
+    # Set while a quiz is half-written; the claim's rollback expires `quiz`
+    unfinished_id = None
+    try:
+        async with generation_claim(db, url):
+            article, cached = await find_existing_quiz(db, url)
+            if cached:
+                yield ndjson(article_event(article))
+                for index, q in enumerate(cached["quiz"]):
+                    yield ndjson({"type": "question", "index": index, "question": q})
+                yield ndjson({"type": "done", "id": article.id, "related_topics": cached["related_topics"]})
+                return
+
+            scraped_data = await scrape_wikipedia_async(url)
+            if not scraped_data:
+                yield ndjson({"type": "error", "detail": "Failed to scrape Wikipedia article."})
+                return
+            if not article:
+                article = await save_article(db, scraped_data)
+            yield ndjson(article_event(article))
+
+            quiz = await start_streaming_quiz(db, article.id)
+            unfinished_id = quiz.id
+            questions = []
+            related_topics = []
+            stream = cached_generate_quiz_stream(
+                scraped_data["title"], scraped_data["full_text"], scraped_data.get("section_texts")
+            )
+            async for kind, payload in iterate_in_threadpool(stream):
+                if kind == "question":
+                    await save_question(db, quiz.id, payload)
+                    yield ndjson({"type": "question", "index": len(questions), "question": payload})
+                    questions.append(payload)
+                else:
+                    related_topics = payload
+            await finish_streaming_quiz(db, quiz, article, questions, related_topics)
+            unfinished_id = None
+            yield ndjson({"type": "done", "id": article.id, "related_topics": related_topics})
+    except Exception as e:
+        log.exception("Streaming generation failed")
+        ERRORS.labels("stream").inc()
+        yield ndjson({"type": "error", "detail": f"AI Quiz Generation failed: {str(e)}"})
+    finally:
+        # Also reached when the client disconnects (CancelledError or
+        # GeneratorExit). Shielded, as the cancelled scope would otherwise
+        # cancel every await here and leave the partial quiz behind.
+        with anyio.CancelScope(shield=True):
+            await db.close()
+            if unfinished_id is not None:
+                log.info("Discarding unfinished streaming quiz %s", unfinished_id)
+                await discard_streaming_quiz(unfinished_id)
+
+@app.post("/generate-quiz/stream")
+async def create_quiz_stream(url: str):
+    """
+    Streams the quiz as NDJSON so the first question arrives while the rest are still being generated.
+    """
+    log.info("Streaming quiz request for %s", url)
+    return StreamingResponse(
+        stream_quiz_events(url),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+class BulkRequest(BaseModel):
+    urls: List[str]
+    scrape_concurrency: int = Field(BULK_SCRAPE_CONCURRENCY, ge=1, le=64)
+    llm_concurrency: int = Field(BULK_LLM_CONCURRENCY, ge=1, le=16)
+    mode: Optional[Literal["single", "mapreduce"]] = None # defaults to GENERATION_MODE
+
+async def bulk_events(request: BulkRequest):
+    async for item in ingest_urls(request.urls, request.scrape_concurrency, request.llm_concurrency, mode=request.mode):
+        yield ndjson(item)
+
+@app.post("/generate-quiz/bulk")
+async def create_quizzes_bulk(request: BulkRequest):
+    """
+    Ingests many URLs at once. Streams one NDJSON result per URL as it finishes,
+    then a summary with throughput. URLs that already have a quiz are skipped,
+    so a repeated request resumes an interrupted run.
+    """
+    log.info("Bulk quiz request for %d URLs", len(request.urls))
+    return StreamingResponse(
+        bulk_events(request),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job["queue_depth"] = job_queue.depth()
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Server-Sent Events stream of job status changes; closes when the job is done or failed.
+    """
+    if not await job_queue.get(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        job_queue.events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/stats")
+async def get_stats():
+    """
+    Cache and coalescing counters for the scrape and generation paths.
+    """
+    return {
+        "scrape_cache": scrape_cache_stats(),
+        "generation_cache": generation_cache_stats(),
+        "prompt_compression": compression_stats(),
+        "gazetteer": gazetteer_stats(),
+        "llm": get_client().stats(),
+        "generation_flights": generation_flights.stats(),
+        "job_queue_depth": job_queue.depth(),
+        "question_bank": question_bank.stats(),
+        "last_refresh": refresh_stats()
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus metrics: per-stage latency histograms, request latency by
+    route, cache hit/miss, LLM token and error counters.
+    """
+    body, content_type = metrics_response()
+    return Response(content=body, media_type=content_type)
+
+def encode_cursor(created_at, article_id):
+    raw = json.dumps([created_at.isoformat(), article_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, article_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(article_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/quizzes")
+async def list_quizzes(
+    request: Request,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    title_prefix: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    One page of history, newest first: articles with a complete quiz, so
+    articles seeded from a dump without one stay out. Only summary columns
+    are selected; pass next_cursor back as cursor to get the following page.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    try:
+        # Question count of the latest complete quiz (ids grow with creation time)
+        latest_quiz = select(func.max(Quiz.id)).where(
+            Quiz.article_id == WikiArticle.id, Quiz.status == "complete"
+        ).correlate(WikiArticle).scalar_subquery()
+        question_count = select(func.count(Question.id)).where(
+            Question.quiz_id == latest_quiz
+        ).correlate(WikiArticle).scalar_subquery()
+
+        has_quiz = select(Quiz.id).where(
+            Quiz.article_id == WikiArticle.id, Quiz.status == "complete"
+        ).correlate(WikiArticle).exists()
+
+        query = select(
+            WikiArticle.id,
+            WikiArticle.title,
+            WikiArticle.url,
+            WikiArticle.created_at,
+            question_count.label("question_count")
+        ).where(has_quiz)
+        if after:
+            created_at, article_id = after
+            query = query.where(or_(
+                WikiArticle.created_at < created_at,
+                and_(WikiArticle.created_at == created_at, WikiArticle.id < article_id)
+            ))
+        if title_prefix:
+            escaped = title_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query = query.where(WikiArticle.title.ilike(escaped + "%", escape="\\"))
+        rows = (await db.execute(
+            query.order_by(WikiArticle.created_at.desc(), WikiArticle.id.desc()).limit(limit + 1)
+        )).all()
+    except Exception as e:
+        log.error("List quizzes failed: %s", e)
+        return {"items": [], "next_cursor": None}
+
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(page[-1].created_at, page[-1].id)
+    body = orjson.dumps({
+        "items": [
             {
-                "question": q.question_text,
-                "options": q.options,
-                "answer": q.answer,
-                "difficulty": q.difficulty,
-                "explanation": q.explanation,
-                "section": q.section # Include section
-            } for q in questions
+                "id": row.id,
+                "title": row.title,
+                "url": row.url,
+                "created_at": row.created_at,
+                "question_count": row.question_count
+            } for row in page
         ],
-        "related_topics": quiz.related_topics
+        "next_cursor": next_cursor
+    })
+    # A page changes whenever a quiz is added, so the validator is the body
+    # itself; revalidation still spares the client the download
+    return cached_response(request, body, etag=content_etag(body), cache_control="public, no-cache")
+
+def encode_search_cursor(score, kind, hit_id):
+    raw = json.dumps([score, kind, hit_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_search_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        score, kind, hit_id = json.loads(raw)
+        return float(score), str(kind), int(hit_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/search")
+async def search_quizzes(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Full-text search over article titles and summaries and question text and
+    explanations, best match first. Pass next_cursor back as cursor for the
+    following page.
+    """
+    after = decode_search_cursor(cursor) if cursor else None
+    try:
+        with span("db_query", "search"):
+            items, next_after = await search(db, q, limit, after)
+    except SearchUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return {
+        "items": items,
+        "next_cursor": encode_search_cursor(*next_after) if next_after else None
     }
 
+@app.get("/quiz/{article_id}")
+async def get_quiz_details(article_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    The latest complete quiz, straight from its stored payload. A stored quiz
+    never changes, so its id and creation time make a strong ETag: a
+    revalidation is answered with a 304 after one small indexed lookup, and
+    only a full response reads the payload.
+    """
+    with span("db_query", "quiz_validator"):
+        latest = (await db.execute(select(Quiz.id, Quiz.created_at).where(
+            Quiz.article_id == article_id, Quiz.status == "complete"
+        ).order_by(Quiz.created_at.desc()).limit(1))).first()
+    if latest:
+        etag = quiz_etag(latest.id, latest.created_at)
+        headers = cache_headers(etag, latest.created_at, f"public, max-age={QUIZ_CACHE_MAX_AGE}")
+        if not_modified(request, etag, latest.created_at):
+            return not_modified_response(headers)
+        payload = await db.scalar(select(Quiz.payload).where(Quiz.id == latest.id))
+        if payload is None:
+            payload = await build_payload(db, latest.id)
+        if payload:
+            count_cache("http", "full")
+            return Response(content=payload, media_type="application/json", headers=headers)
+
+    if not await db.get(WikiArticle, article_id):
+        raise HTTPException(status_code=404, detail="Article not found")
+    raise HTTPException(status_code=404, detail="Quiz not found")
+
+@app.get("/quiz/{article_id}/variant")
+async def get_quiz_variant(
+    article_id: int,
+    size: int = Query(QUIZ_VARIANT_SIZE, ge=1, le=QUIZ_VARIANT_MAX_SIZE),
+    difficulty: Optional[str] = Query(None, max_length=200),
+    section: Optional[List[str]] = Query(None),
+    seed: Optional[int] = None
+):
+    """
+    A fresh random quiz assembled from every question stored for the
+    article, with no LLM call. difficulty is a weighted mix such as
+    "easy:3,medium:5,hard:2"; section (repeatable) limits the sections
+    drawn from, and the questions are spread across them. Pass the returned
+    seed back to get the same variant again.
+    """
+    try:
+        mix = parse_mix(difficulty) if difficulty else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid difficulty mix: {e}")
+    bank = await question_bank.get(article_id)
+    if bank is None:
+        raise HTTPException(status_code=404, detail="Article not found")
+    if seed is None:
+        seed = random.getrandbits(32)
+    with span("assemble", "quiz_variant"):
+        quiz = assemble(bank, size, mix, section, random.Random(seed))
+    if not quiz:
+        raise HTTPException(status_code=404, detail="No stored questions match this request")
+    return Response(content=orjson.dumps(dict(bank.header, quiz=quiz, related_topics=bank.related_topics, variant={
+        "seed": seed,
+        "available": len(bank.questions),
+        "difficulties": Counter(q["difficulty"] for q in quiz)
+    })), media_type="application/json")
+
+@app.get("/articles/{article_id}/raw-html")
+async def get_article_raw_html(article_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    The stored page HTML. Only this endpoint reads (and decompresses) the blob.
+    """
+    article = await db.get(WikiArticle, article_id)
+    if not article:
+        raise HTTPException(status_code=404, detail="Article not found")
+    html = await get_article_html(db, article)
+    if html is None:
+        raise HTTPException(status_code=404, detail="No stored HTML for this article")
+    return Response(content=html, media_type="text/html; charset=utf-8")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="localhost", port=8000)
@@ -0,0 +1,148 @@
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import orjson
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# Logging: LOG_LEVEL (DEBUG shows per-stage timings), LOG_FORMAT "text" or "json"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "wikiquiz_stage_seconds", "Time spent in one stage of handling a request",
+    ["stage", "operation"], buckets=STAGE_BUCKETS,
+)
+STAGE_ERRORS = Counter("wikiquiz_stage_errors_total", "Stages that raised", ["stage", "operation"])
+REQUEST_SECONDS = Histogram(
+    "wikiquiz_http_request_seconds", "HTTP request latency by route",
+    ["method", "route", "status"], buckets=STAGE_BUCKETS,
+)
+CACHE_EVENTS = Counter("wikiquiz_cache_events_total", "Cache lookups by cache and outcome", ["cache", "result"])
+LLM_TOKENS = Counter("wikiquiz_llm_tokens_total", "LLM tokens used", ["direction"])
+LLM_CALLS = Counter("wikiquiz_llm_calls_total", "LLM call attempts by outcome", ["outcome"])
+ERRORS = Counter("wikiquiz_errors_total", "Handled errors by kind", ["kind"])
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message and any `extra` fields.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        fields = [f"{key}={value}" for key, value in vars(record).items() if key not in _RECORD_FIELDS]
+        return line + (" " + " ".join(fields) if fields else "")
+
+_configured = False
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """
+    Configures the root logger once (idempotent). Library modules only call
+    logging.getLogger(__name__); entry points call this.
+    """
+    global _configured
+    if _configured:
+        return
+    handler = logging.StreamHandler(sys.stderr)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    # Third-party request logs are noise at INFO
+    logging.getLogger("httpx").setLevel(max(logging.WARNING, root.level))
+    _configured = True
+
+_span_log = logging.getLogger("wikiquiz.span")
+# Labelled children resolved once per (stage, operation); .labels() takes a lock
+_span_metrics = {}
+
+def _metrics_for(stage, operation):
+    metrics = _span_metrics.get((stage, operation))
+    if metrics is None:
+        metrics = _span_metrics[(stage, operation)] = (
+            STAGE_SECONDS.labels(stage, operation), STAGE_ERRORS.labels(stage, operation)
+        )
+    return metrics
+
+@contextmanager
+def span(stage, operation=""):
+    """
+    Times the enclosed block into wikiquiz_stage_seconds{stage, operation}
+    and counts it in wikiquiz_stage_errors_total if it raises. Costs a few
+    of microseconds; the DEBUG log line is skipped unless enabled.
+    """
+    histogram, errors = _metrics_for(stage, operation)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        errors.inc()
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        histogram.observe(seconds)
+        if _span_log.isEnabledFor(logging.DEBUG):
+            _span_log.debug("%s%s took %.1f ms", stage, f"/{operation}" if operation else "", seconds * 1000,
+                            extra={"stage": stage, "operation": operation, "seconds": round(seconds, 6)})
+
+def count_cache(cache, result):
+    CACHE_EVENTS.labels(cache, result).inc()
+
+def metrics_response():
+    """
+    (body, content type) for the /metrics endpoint.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request latency by route template (not
+    raw path, to keep label cardinality bounded). Streaming responses are
+    timed until their last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.labels(scope["method"], path, str(status[0])).observe(time.perf_counter() - start)
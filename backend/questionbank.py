@@ -0,0 +1,233 @@
+import math
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from sqlalchemy import select
+from cache import TTLCache
+from database import AsyncSessionLocal, WikiArticle, Quiz, Question
+from singleflight import SingleFlight
+from observability import span, count_cache
+
+# Articles whose questions are held in memory; the least recently used are dropped
+QUESTION_BANK_MAX_ARTICLES = int(os.getenv("QUESTION_BANK_MAX_ARTICLES", "5000"))
+# An indexed article is reloaded from scratch after this long, which also drops deleted quizzes
+QUESTION_BANK_TTL_SECONDS = int(os.getenv("QUESTION_BANK_TTL_SECONDS", "86400"))
+# How often an indexed article looks for quizzes stored by other workers
+QUESTION_BANK_SYNC_SECONDS = float(os.getenv("QUESTION_BANK_SYNC_SECONDS", "30"))
+
+def _question_key(text):
+    return " ".join((text or "").lower().split())
+
+class ArticleBank:
+    """
+    Every question stored for one article across its complete quizzes,
+    deduplicated by text and indexed by (section, difficulty). quiz_ids
+    records which quizzes are in, so a sync only reads the new ones.
+    """
+
+    def __init__(self, article):
+        self.header = {
+            "id": article.id,
+            "url": article.url,
+            "title": article.title,
+            "summary": article.summary,
+            "key_entities": article.key_entities,
+            "sections": article.sections,
+        }
+        self.related_topics = []
+        self.questions = []
+        self.index = defaultdict(list)  # (section, difficulty) -> positions in questions
+        self.quiz_ids = set()
+        self.synced_at = time.monotonic()
+        self.stale = False
+        self._seen = set()
+
+    def add(self, quiz_ids, questions, related_topics=None):
+        for q in questions:
+            key = _question_key(q["question"])
+            if key in self._seen:
+                continue
+            self._seen.add(key)
+            self.index[(q["section"], (q["difficulty"] or "").lower())].append(len(self.questions))
+            self.questions.append(q)
+        self.quiz_ids.update(quiz_ids)
+        if related_topics is not None:
+            self.related_topics = related_topics
+        self.synced_at = time.monotonic()
+        self.stale = False
+
+async def _new_questions(db, article_id, known_quiz_ids):
+    """
+    (quiz ids, question dicts, latest related topics) for the article's
+    complete quizzes not in known_quiz_ids. Two indexed queries.
+    """
+    quizzes = (await db.execute(select(Quiz.id, Quiz.related_topics).where(
+        Quiz.article_id == article_id, Quiz.status == "complete"
+    ).order_by(Quiz.id))).all()
+    fresh = [row.id for row in quizzes if row.id not in known_quiz_ids]
+    if not fresh:
+        return [], [], None
+    rows = await db.execute(select(
+        Question.question_text, Question.options, Question.answer,
+        Question.difficulty, Question.explanation, Question.section
+    ).where(Question.quiz_id.in_(fresh)).order_by(Question.id))
+    questions = [
+        {
+            "question": row.question_text,
+            "options": row.options,
+            "answer": row.answer,
+            "difficulty": row.difficulty,
+            "explanation": row.explanation,
+            "section": row.section or "General"
+        } for row in rows
+    ]
+    return fresh, questions, quizzes[-1].related_topics
+
+class QuestionBank:
+    """
+    In-memory index of stored questions per article, filled on first use
+    and extended incrementally: inserts mark the article stale (or, from
+    other workers, the periodic sync notices them) and only the quizzes not
+    yet indexed are read.
+    """
+
+    def __init__(self, maxsize=QUESTION_BANK_MAX_ARTICLES, ttl=QUESTION_BANK_TTL_SECONDS,
+                 sync_seconds=QUESTION_BANK_SYNC_SECONDS):
+        self._articles = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._loads = SingleFlight()
+        self.sync_seconds = sync_seconds
+        self.syncs = 0
+
+    def mark_stale(self, article_id):
+        """
+        Called after a quiz for article_id is committed; the next lookup
+        indexes its questions.
+        """
+        bank = self._articles.peek(article_id)
+        if bank is not None:
+            bank.stale = True
+
+    async def _load(self, article_id):
+        async with AsyncSessionLocal() as db:
+            with span("db_query", "question_bank_load"):
+                article = await db.get(WikiArticle, article_id)
+                if article is None:
+                    return None
+                bank = ArticleBank(article)
+                bank.add(*await _new_questions(db, article_id, set()))
+        self._articles.set(article_id, bank)
+        return bank
+
+    async def _sync(self, bank):
+        async with AsyncSessionLocal() as db:
+            with span("db_query", "question_bank_sync"):
+                quiz_ids, questions, related_topics = await _new_questions(db, bank.header["id"], bank.quiz_ids)
+        bank.add(quiz_ids, questions, related_topics)
+        self.syncs += 1
+        return bank
+
+    async def get(self, article_id):
+        """
+        The ArticleBank for article_id, or None if there is no such article.
+        """
+        bank = self._articles.get(article_id)
+        if bank is None:
+            count_cache("question_bank", "miss")
+            return await self._loads.do(article_id, lambda: self._load(article_id))
+        if bank.stale or time.monotonic() - bank.synced_at > self.sync_seconds:
+            count_cache("question_bank", "sync")
+            return await self._loads.do(article_id, lambda: self._sync(bank))
+        count_cache("question_bank", "hit")
+        return bank
+
+    def stats(self):
+        return dict(self._articles.stats(), syncs=self.syncs)
+
+question_bank = QuestionBank()
+
+def parse_mix(text):
+    """
+    Difficulty weights from "easy:3,medium:5,hard:2" (counts or fractions,
+    any scale). Raises ValueError on malformed input.
+    """
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition(":")
+        name = name.strip().lower()
+        if not name or not weight:
+            raise ValueError(f"Expected difficulty:weight, got {part.strip()!r}")
+        mix[name] = float(weight)
+        if not math.isfinite(mix[name]) or mix[name] < 0:
+            raise ValueError(f"Invalid weight for {name}")
+    if not sum(mix.values()):
+        raise ValueError("All difficulty weights are zero")
+    return mix
+
+def allocate(size, mix):
+    """
+    Splits size questions across difficulties in proportion to mix
+    (largest remainder, so the counts add up to size).
+    """
+    total = sum(mix.values())
+    exact = {name: size * weight / total for name, weight in mix.items()}
+    counts = {name: int(share) for name, share in exact.items()}
+    for name in sorted(exact, key=lambda n: exact[n] - counts[n], reverse=True)[:size - sum(counts.values())]:
+        counts[name] += 1
+    return counts
+
+def _draw(pools, count, covered, rng):
+    """
+    Takes up to count positions from pools ({section: shuffled positions}),
+    always from the section used least so far, so a variant spreads over as
+    many sections as it can.
+    """
+    taken = []
+    while len(taken) < count:
+        open_sections = [section for section, positions in pools.items() if positions]
+        if not open_sections:
+            break
+        section = min(open_sections, key=lambda s: (covered[s], rng.random()))
+        taken.append(pools[section].pop())
+        covered[section] += 1
+    return taken
+
+def assemble(bank, size, mix=None, sections=None, rng=random):
+    """
+    A random quiz of up to size questions from bank. mix ({difficulty:
+    weight}) sets the difficulty split; any shortfall in one difficulty is
+    filled from the others. sections restricts the questions to those
+    sections. Options are shuffled; the answer is matched by text, so it
+    stays correct.
+    """
+    allowed = {s.lower() for s in sections} if sections else None
+    by_difficulty = defaultdict(lambda: defaultdict(list))
+    for (section, difficulty), positions in bank.index.items():
+        if allowed is None or section.lower() in allowed:
+            by_difficulty[difficulty][section].extend(positions)
+    for pools in by_difficulty.values():
+        for positions in pools.values():
+            rng.shuffle(positions)
+
+    covered = Counter()
+    chosen = []
+    if mix:
+        for difficulty, count in allocate(size, mix).items():
+            chosen += _draw(by_difficulty.get(difficulty, {}), count, covered, rng)
+    if len(chosen) < size:
+        rest = defaultdict(list)
+        for pools in by_difficulty.values():
+            for section, positions in pools.items():
+                rest[section].extend(positions)
+        for positions in rest.values():
+            rng.shuffle(positions)
+        chosen += _draw(rest, size - len(chosen), covered, rng)
+    rng.shuffle(chosen)
+
+    quiz = []
+    for position in chosen:
+        question = dict(bank.questions[position])
+        options = question["options"] or []
+        question["options"] = rng.sample(options, len(options))
+        quiz.append(question)
+    return quiz
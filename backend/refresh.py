@@ -0,0 +1,271 @@
+"""
+Keep stored articles current with Wikipedia.
+
+Usage (from backend/):
+    python refresh.py
+    python refresh.py --concurrency 8 --rate 10 --min-age 3600 --limit 5000
+
+Checks stored articles against their live revision in batches of 50 (one
+MediaWiki revisions query each), re-scrapes only articles whose revision
+moved, and regenerates the quiz only when the extracted text itself changed.
+Articles checked within --min-age seconds are skipped, so frequent runs cost
+little. Run it from cron, or set REFRESH_INTERVAL_SECONDS to have the API
+process run it on a schedule.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select, update, or_, func
+from database import init_db_async, async_engine, AsyncSessionLocal, WikiArticle, Quiz, \
+    claim_generation, hold_generation, release_generation
+from scraper import scrape_wikipedia_async, fetch_revisions, close_http_client, normalize_url, REVISIONS_PER_QUERY
+from llm_cache import cached_generate_quiz
+from generator import GENERATION_MODE
+from blobstore import put_html_async
+from bulk import add_quiz, claim, release
+from questionbank import question_bank
+from observability import setup_logging, span, ERRORS
+
+# Articles re-scraped (and regenerated) at the same time
+REFRESH_CONCURRENCY = int(os.getenv("REFRESH_CONCURRENCY", "4"))
+# Upstream requests per second, revision queries and re-scrapes together (0 = unlimited)
+REFRESH_REQUESTS_PER_SECOND = float(os.getenv("REFRESH_REQUESTS_PER_SECOND", "5"))
+# Articles checked more recently than this are skipped
+REFRESH_MIN_AGE_SECONDS = int(os.getenv("REFRESH_MIN_AGE_SECONDS", "86400"))
+# Run a refresh from the API process this often (0 = never; use cron instead)
+REFRESH_INTERVAL_SECONDS = int(os.getenv("REFRESH_INTERVAL_SECONDS", "0"))
+
+# Claim row that keeps API workers from refreshing at the same time
+REFRESH_CLAIM_KEY = "refresh:articles"
+
+log = logging.getLogger(__name__)
+
+last_refresh = {}
+
+class RateLimiter:
+    """
+    Spaces acquisitions at least 1/rate seconds apart across tasks.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+async def due_articles(after_id, cutoff, limit):
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(
+            WikiArticle.id, WikiArticle.url, WikiArticle.revision_id, WikiArticle.content_hash
+        ).where(
+            WikiArticle.id > after_id,
+            or_(WikiArticle.checked_at.is_(None), WikiArticle.checked_at < cutoff)
+        ).order_by(WikiArticle.id).limit(limit))).all()
+
+async def mark_checked(article_ids, **fields):
+    if not article_ids:
+        return
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(WikiArticle).where(WikiArticle.id.in_(article_ids)).values(
+            checked_at=datetime.utcnow(), **fields
+        ))
+        with span("db_commit", "refresh_checked"):
+            await db.commit()
+
+async def has_quiz(article_id):
+    async with AsyncSessionLocal() as db:
+        count = await db.scalar(select(func.count(Quiz.id)).where(
+            Quiz.article_id == article_id, Quiz.status == "complete"
+        ))
+        return bool(count)
+
+async def store_refresh(article_id, scraped, revision_id, generated):
+    """
+    Writes the re-scraped article and, if one was generated, its new quiz in
+    one transaction. The new quiz becomes the article's latest.
+    """
+    async with AsyncSessionLocal() as db:
+        article = await db.get(WikiArticle, article_id)
+        article.title = scraped["title"]
+        article.summary = scraped["summary"]
+        article.sections = scraped["sections"]
+        article.key_entities = scraped["key_entities"]
+        article.raw_html_hash = await put_html_async(db, scraped["raw_html"])
+        article.revision_id = revision_id
+        article.content_hash = scraped["content_hash"]
+        article.checked_at = datetime.utcnow()
+        questions = await add_quiz(db, article, generated) if generated else 0
+        with span("db_commit", "refresh_article"):
+            await db.commit()
+        if generated:
+            question_bank.mark_stale(article_id)
+        return questions
+
+async def refresh_article(row, revision_id, limiter, mode=None):
+    """
+    Re-scrapes one article whose revision moved. Returns its outcome:
+    "unchanged" when the extracted text is the same (only the revision is
+    recorded), "updated" or "regenerated" otherwise.
+    """
+    await limiter.wait()
+    scraped = await scrape_wikipedia_async(row.url, revalidate=True, whole_article=(mode or GENERATION_MODE) == "mapreduce")
+    if not scraped:
+        raise Exception("Failed to scrape Wikipedia article.")
+    if scraped["content_hash"] == row.content_hash:
+        await mark_checked([row.id], revision_id=revision_id)
+        return "unchanged"
+    if row.content_hash is None:
+        # Stored before hashes were recorded: nothing to compare against, so
+        # take this scrape as the baseline rather than regenerate every quiz
+        await mark_checked([row.id], revision_id=revision_id, content_hash=scraped["content_hash"])
+        return "unchanged"
+
+    if not await has_quiz(row.id):
+        await store_refresh(row.id, scraped, revision_id, None)
+        return "updated"
+
+    # Same claim as /generate-quiz and bulk ingestion, so a request for this
+    # article does not generate a second quiz alongside the refresh
+    url_key = normalize_url(row.url)
+    heartbeat = await claim(url_key)
+    if heartbeat is None:
+        # Left unchecked, so the next pass picks it up again
+        raise Exception("Article is being generated elsewhere.")
+    try:
+        generated = await run_in_threadpool(
+            cached_generate_quiz, scraped["title"], scraped["full_text"], scraped.get("section_texts"), mode
+        )
+        if not generated or "error" in generated:
+            raise Exception(f"AI Quiz Generation failed: {(generated or {}).get('error', 'no result')}")
+        await store_refresh(row.id, scraped, revision_id, generated)
+    finally:
+        await release(url_key, heartbeat)
+    return "regenerated"
+
+async def refresh_articles(concurrency=REFRESH_CONCURRENCY, rate=REFRESH_REQUESTS_PER_SECOND,
+                           min_age=REFRESH_MIN_AGE_SECONDS, limit=None, mode=None):
+    """
+    One refresh pass over stored articles not checked for min_age seconds,
+    at most limit of them. Unchanged articles cost one row in a batched
+    revisions query; only changed ones are scraped and regenerated.
+    Returns a summary dict of counts.
+    """
+    started = time.perf_counter()
+    cutoff = datetime.utcnow() - timedelta(seconds=min_age)
+    limiter = RateLimiter(rate)
+    slots = asyncio.Semaphore(concurrency)
+    counts = {"checked": 0, "current": 0, "unchanged": 0, "updated": 0, "regenerated": 0, "failed": 0}
+    running = set()
+
+    async def process(row, revision_id):
+        async with slots:
+            try:
+                outcome = await refresh_article(row, revision_id, limiter, mode)
+            except Exception as e:
+                log.warning("Refresh failed for %s: %s", row.url, e)
+                ERRORS.labels("refresh").inc()
+                outcome = "failed"
+        counts[outcome] += 1
+
+    last_id = 0
+    while limit is None or counts["checked"] < limit:
+        size = REVISIONS_PER_QUERY if limit is None else min(REVISIONS_PER_QUERY, limit - counts["checked"])
+        rows = await due_articles(last_id, cutoff, size)
+        if not rows:
+            break
+        last_id = rows[-1].id
+        await limiter.wait()
+        revisions = await fetch_revisions([row.url for row in rows])
+        counts["checked"] += len(rows)
+
+        current = [row.id for row in rows if revisions[row.url] is not None and revisions[row.url] == row.revision_id]
+        counts["current"] += len(current)
+        await mark_checked(current)
+        for row in rows:
+            revision_id = revisions[row.url]
+            if revision_id is None:
+                # Missing page or failed query: leave it due for the next pass
+                counts["failed"] += 1
+            elif revision_id != row.revision_id:
+                task = asyncio.create_task(process(row, revision_id))
+                running.add(task)
+                task.add_done_callback(running.discard)
+        # Keep scanning while changed articles are processed, but not too far ahead
+        while len(running) >= concurrency * 4:
+            await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+    if running:
+        await asyncio.wait(running)
+
+    summary = dict(counts, elapsed_seconds=round(time.perf_counter() - started, 3),
+                   finished_at=datetime.utcnow().isoformat(timespec="seconds"))
+    last_refresh.clear()
+    last_refresh.update(summary)
+    log.info("Refresh finished: %s", summary)
+    return summary
+
+async def refresh_loop(interval=REFRESH_INTERVAL_SECONDS):
+    """
+    Runs refresh_articles every interval seconds for the life of the API
+    process. A claim row makes sure only one worker refreshes at a time.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as db:
+                if not await claim_generation(db, REFRESH_CLAIM_KEY):
+                    log.debug("Another worker is refreshing; skipping this round")
+                    continue
+                # A pass can outlast the claim TTL
+                heartbeat = asyncio.create_task(hold_generation(REFRESH_CLAIM_KEY))
+                try:
+                    await refresh_articles()
+                finally:
+                    heartbeat.cancel()
+                    await release_generation(db, REFRESH_CLAIM_KEY)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Scheduled refresh failed")
+
+def refresh_stats():
+    return dict(last_refresh)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=REFRESH_CONCURRENCY, help="Articles re-scraped at once")
+    parser.add_argument("--rate", type=float, default=REFRESH_REQUESTS_PER_SECOND,
+                        help="Upstream requests per second (0 = unlimited)")
+    parser.add_argument("--min-age", type=int, default=REFRESH_MIN_AGE_SECONDS,
+                        help="Skip articles checked within this many seconds")
+    parser.add_argument("--limit", type=int, help="Check at most this many articles")
+    parser.add_argument("--mode", choices=["single", "mapreduce"], help="Generation mode (default: GENERATION_MODE)")
+    args = parser.parse_args()
+
+    setup_logging()
+
+    async def run():
+        await init_db_async()
+        try:
+            return await refresh_articles(args.concurrency, args.rate, args.min_age, args.limit, args.mode)
+        finally:
+            await close_http_client()
+            await async_engine.dispose()
+
+    summary = asyncio.run(run())
+    print(f"Checked {summary['checked']} articles in {summary['elapsed_seconds']}s: {summary['current']} current, "
+          f"{summary['unchanged']} new revision with unchanged text, {summary['updated']} updated, "
+          f"{summary['regenerated']} regenerated, {summary['failed']} failed")
+
+if __name__ == "__main__":
+    main()
@@ -1,82 +1,327 @@
-import requests
-from bs4 import BeautifulSoup
-import re
+import asyncio
+import logging
+import os
+import time
+import httpx
+import xxhash
+from urllib.parse import urlsplit, urlunsplit, unquote, quote, parse_qsl, urlencode
+from cache import TTLCache
+from extractor import extract_article, page_revision, SECTION_TEXT_BUDGET, WHOLE_ARTICLE_BUDGET
+from entities import extract_entities
+from fixtures import fixture_page, fixture_etag, fixture_revisions, title_from_url
+from observability import span, count_cache, ERRORS
 
-def scrape_wikipedia(url):
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Where pages come from: "http" fetches them over the network, "fixtures"
+# serves saved pages from SCRAPER_FIXTURE_DIR without any network traffic.
+# SCRAPER_UPSTREAM redirects http fetches to another host (e.g. the local
+# fixture server, http://127.0.0.1:8765) while URLs keep their Wikipedia form.
+SCRAPER_PROVIDER = os.getenv("SCRAPER_PROVIDER", "http").lower()
+SCRAPER_UPSTREAM = os.getenv("SCRAPER_UPSTREAM", "").rstrip("/")
+SCRAPER_FIXTURE_LATENCY = float(os.getenv("SCRAPER_FIXTURE_LATENCY", "0"))
+
+# Connection pool settings for the shared HTTP client
+REQUEST_TIMEOUT = float(os.getenv("SCRAPER_TIMEOUT", "10"))
+MAX_CONNECTIONS = int(os.getenv("SCRAPER_MAX_CONNECTIONS", "20"))
+MAX_CONNECTIONS_PER_HOST = int(os.getenv("SCRAPER_MAX_CONNECTIONS_PER_HOST", "6"))
+KEEPALIVE_EXPIRY = float(os.getenv("SCRAPER_KEEPALIVE_EXPIRY", "30"))
+
+# Parsed-article cache shared by /preview-article and /generate-quiz.
+# Entries younger than SCRAPE_CACHE_FRESH_SECONDS are served without any network
+# traffic; older ones are revalidated with a conditional GET until they expire.
+SCRAPE_CACHE_SIZE = int(os.getenv("SCRAPE_CACHE_SIZE", "256"))
+SCRAPE_CACHE_FRESH_SECONDS = float(os.getenv("SCRAPE_CACHE_FRESH_SECONDS", "300"))
+SCRAPE_CACHE_TTL_SECONDS = float(os.getenv("SCRAPE_CACHE_TTL_SECONDS", "3600"))
+# Page HTML held by the scrape cache, in bytes; entries keep it for saving
+# the article, and a long page can run to megabytes
+SCRAPE_CACHE_MAX_BYTES = int(os.getenv("SCRAPE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Titles per MediaWiki revisions query (the API's limit for ordinary clients)
+REVISIONS_PER_QUERY = 50
+
+log = logging.getLogger(__name__)
+
+_client = None
+_host_slots = {}
+
+def _entry_bytes(entry):
+    return len(entry["data"]["raw_html"] or b"")
+
+article_cache = TTLCache(maxsize=SCRAPE_CACHE_SIZE, ttl=SCRAPE_CACHE_TTL_SECONDS,
+                         maxweight=SCRAPE_CACHE_MAX_BYTES, weigh=_entry_bytes)
+revalidation_stats = {"fresh_hits": 0, "not_modified": 0, "refetched": 0}
+
+def normalize_url(url):
     """
-    Scrapes a Wikipedia article and returns a structured dictionary of content.
+    Canonical form of a Wikipedia URL used as a cache key: https, lower-case
+    desktop host, decoded title with underscores, sorted query, no fragment.
     """
-    print(f"Scraper: Fetching URL: {url}")
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if ".m.wikipedia.org" in host:
+        host = host.replace(".m.wikipedia.org", ".wikipedia.org")
+    path = quote(unquote(parts.path).replace(" ", "_"), safe="/:_()',!*$@;-.~")
+    query = urlencode(sorted(parse_qsl(parts.query)))
+    return urlunsplit(("https", host, path, query, ""))
+
+def get_http_client():
+    """
+    Returns the process-wide pooled HTTP/2 client, creating it on first use.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            headers=HEADERS,
+            timeout=REQUEST_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _client
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    # Semaphores are bound to the running loop, so drop them with the client
+    _host_slots.clear()
+
+def _host_slot(host):
+    slot = _host_slots.get(host)
+    if slot is None:
+        slot = _host_slots[host] = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+    return slot
+
+def upstream_url(url):
+    if not SCRAPER_UPSTREAM:
+        return url
+    parts = urlsplit(url)
+    return SCRAPER_UPSTREAM + urlunsplit(("", "", parts.path, parts.query, ""))
+
+async def fetch_fixture(url, etag=None):
+    """
+    Fixture provider: answers like Wikipedia would, from saved pages.
+    """
+    if SCRAPER_FIXTURE_LATENCY:
+        await asyncio.sleep(SCRAPER_FIXTURE_LATENCY)
+    page = fixture_page(title_from_url(url))
+    if page is None:
+        log.warning("No fixture for %s", url)
+        return None
+    tag = fixture_etag(page)
+    request = httpx.Request("GET", url)
+    if etag == tag:
+        return httpx.Response(304, headers={"etag": tag}, request=request)
+    return httpx.Response(200, content=page, headers={"etag": tag, "content-type": "text/html"}, request=request)
+
+async def fetch_page(url, etag=None, last_modified=None):
+    """
+    Fetches a page through the shared client, honouring the per-host connection limit.
+    Sends conditional headers when validators are given. Returns the response
+    (200 or 304), or None on failure.
+    """
+    if SCRAPER_PROVIDER == "fixtures":
+        with span("fetch"):
+            return await fetch_fixture(url, etag)
+    url = upstream_url(url)
+    log.debug("Fetching %s", url)
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        async with _host_slot(urlsplit(url).netloc):
+            with span("fetch"):
+                response = await get_http_client().get(url, headers=headers)
+        if response.status_code == 304:
+            log.debug("Not modified since last fetch: %s", url)
+            return response
         response.raise_for_status()
-        print("Scraper: Successfully fetched HTML.")
     except Exception as e:
-        print(f"Scraper: Error fetching URL: {e}")
+        log.warning("Error fetching %s: %s", url, e)
+        ERRORS.labels("fetch").inc()
         return None
+    return response
 
-    soup = BeautifulSoup(response.content, 'html.parser')
-
-    # Extract Title
-    title = soup.find('h1', id='firstHeading').text.strip()
-
-    # Extract Summary (usually the first few paragraphs before the first heading)
-    content_div = soup.find('div', id='mw-content-text').find('div', class_='mw-parser-output')
-    
-    summary = ""
-    paragraphs = content_div.find_all('p', recursive=False)
-    for p in paragraphs:
-        if p.text.strip():
-            summary = p.text.strip()
-            # Clean up citations like [1], [2], etc.
-            summary = re.sub(r'\[\d+\]', '', summary)
-            break
-
-    # Extract Sections
-    sections = []
-    headers = content_div.find_all(['h2', 'h3'], recursive=False)
-    for header in headers:
-        text = header.find('span', class_='mw-headline')
-        if text:
-            sections.append(text.text.strip())
-
-    # Extract Full Text for LLM
-    full_text = ""
-    for element in content_div.find_all(['p', 'h2', 'h3'], recursive=False):
-        text = element.text.strip()
-        text = re.sub(r'\[\d+\]', '', text)
-        if text:
-            full_text += text + "\n\n"
-
-    # Simple Entity Extraction (Mocked or basic regex/heuristic for now)
-    # Wikipedia often has links for important entities.
-    entities = {
-        "people": [],
-        "organizations": [],
-        "locations": []
-    }
-    
-    # Heuristic: Look for links in the summary or intro
-    links = content_div.find_all('a', href=re.compile(r'^/wiki/'), limit=15)
-    for link in links:
-        entity_name = link.text.strip()
-        if entity_name and entity_name not in entities["people"] and not entity_name.startswith('['):
-            # Very basic categorization for now
-            entities["people"].append(entity_name)
+def parse_article(url, content, section_budget=SECTION_TEXT_BUDGET):
+    """
+    Parses raw Wikipedia HTML into a structured dictionary of content.
+    Title, summary, sections, text and links are collected in a single pass.
+    """
+    with span("parse"):
+        page = extract_article(content, section_budget=section_budget)
+    if page.title is None or not page.found_content:
+        log.warning("Page does not look like a Wikipedia article: %s", url)
+        ERRORS.labels("parse").inc()
+        return None
+    return article_data(url, page, content, page_revision(content))
+
+def content_hash(page):
+    """
+    xxh3-128 of what quiz generation reads from a page (title, text and
+    section paragraphs), whitespace-normalized. Edits that leave these
+    unchanged (categories, templates, references) hash the same.
+    """
+    h = xxhash.xxh3_128()
+    parts = [page.title or "", page.full_text]
+    for section in page.section_texts:
+        parts.append(section["title"])
+        parts.extend(section["paragraphs"])
+    for part in parts:
+        h.update(" ".join(part.split()).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
 
+def article_data(url, page, raw_html, revision_id=None):
+    """
+    The scrape result dict for an extracted page: anything with title,
+    summary, sections, full_text, section_texts and links attributes
+    (an ArticleExtractor, or a wikidump.WikitextPage for dump imports).
+    """
     return {
         "url": url,
-        "title": title,
-        "summary": summary,
-        "sections": sections,
-        "full_text": full_text[:10000], # Limit text for LLM token limits
-        "key_entities": entities,
-        "raw_html": str(response.content)
+        "title": page.title,
+        "summary": page.summary,
+        "sections": page.sections,
+        "full_text": page.full_text, # Limited to TEXT_BUDGET for LLM token limits
+        "section_texts": page.section_texts, # Whole article by heading, for section-parallel generation
+        "key_entities": extract_entities(page.full_text), # Gazetteer matches by kind (entities.py)
+        "raw_html": raw_html, # bytes; stored compressed by blobstore.put_html
+        "revision_id": revision_id,
+        "content_hash": content_hash(page)
     }
 
+async def scrape_wikipedia_async(url, revalidate=False, whole_article=False):
+    """
+    Scrapes a Wikipedia article without blocking the event loop.
+    The fetch goes through the pooled client; parsing runs in a worker thread.
+    Results are cached by normalized URL and revalidated with ETag /
+    If-Modified-Since once they are no longer fresh. revalidate=True always
+    checks with the server and returns None rather than a stale copy when
+    that fails. whole_article=True keeps section text for map-reduce
+    generation even when the default section budget is 0; a cached parse
+    with less is fetched and parsed again.
+    """
+    key = normalize_url(url)
+    section_budget = max(SECTION_TEXT_BUDGET, WHOLE_ARTICLE_BUDGET) if whole_article else SECTION_TEXT_BUDGET
+    entry = article_cache.get(key)
+    if entry and entry["section_budget"] < section_budget:
+        entry = None
+    if entry and not revalidate and time.monotonic() - entry["checked_at"] < SCRAPE_CACHE_FRESH_SECONDS:
+        revalidation_stats["fresh_hits"] += 1
+        count_cache("scrape", "hit")
+        log.debug("Scrape cache hit for %s", key)
+        return dict(entry["data"], url=url)
+
+    if entry:
+        response = await fetch_page(url, entry["etag"], entry["last_modified"])
+    else:
+        response = await fetch_page(url)
+    if response is None:
+        # Serve the stale copy rather than failing when revalidation is impossible
+        return dict(entry["data"], url=url) if entry and not revalidate else None
+
+    if response.status_code == 304 and entry:
+        revalidation_stats["not_modified"] += 1
+        count_cache("scrape", "revalidated")
+        entry["checked_at"] = time.monotonic()
+        article_cache.set(key, entry)
+        return dict(entry["data"], url=url)
+
+    count_cache("scrape", "miss")
+    data = await asyncio.to_thread(parse_article, url, response.content, section_budget)
+    if data:
+        if entry:
+            revalidation_stats["refetched"] += 1
+        article_cache.set(key, {
+            "data": data,
+            "section_budget": section_budget,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "checked_at": time.monotonic(),
+        })
+    return data
+
+def _revision_map(data):
+    """
+    Lookup from requested title to revid for a formatversion=2 revisions
+    query, following the API's title normalization and redirects.
+    """
+    query = data.get("query", {})
+    renamed = {r["from"]: r["to"] for r in query.get("normalized", []) + query.get("redirects", [])}
+    current = {p["title"]: p["revisions"][0]["revid"] for p in query.get("pages", []) if p.get("revisions")}
+
+    def resolve(title):
+        # normalized, then redirected: at most two hops
+        for _ in range(3):
+            if title in current:
+                return current[title]
+            if title not in renamed:
+                return None
+            title = renamed[title]
+        return None
+    return resolve
+
+async def fetch_revisions(urls):
+    """
+    {url: current revision id} for up to REVISIONS_PER_QUERY article URLs,
+    with one batched MediaWiki revisions query per host. The value is None
+    for missing pages and for URLs whose query failed.
+    """
+    by_host = {}
+    for url in urls:
+        by_host.setdefault(urlsplit(normalize_url(url)).netloc, []).append(url)
+    revisions = {}
+    for host, host_urls in by_host.items():
+        titles = {url: title_from_url(url) for url in host_urls}
+        try:
+            with span("fetch", "revisions"):
+                if SCRAPER_PROVIDER == "fixtures":
+                    data = fixture_revisions(list(titles.values()))
+                else:
+                    api = upstream_url(f"https://{host}/w/api.php")
+                    async with _host_slot(urlsplit(api).netloc):
+                        response = await get_http_client().get(api, params={
+                            "action": "query", "prop": "revisions", "rvprop": "ids", "redirects": "1",
+                            "titles": "|".join(dict.fromkeys(titles.values())),
+                            "format": "json", "formatversion": "2",
+                        })
+                    response.raise_for_status()
+                    data = response.json()
+        except Exception as e:
+            log.warning("Revisions query failed for %d pages on %s: %s", len(host_urls), host, e)
+            ERRORS.labels("fetch").inc()
+            revisions.update(dict.fromkeys(host_urls))
+            continue
+        resolve = _revision_map(data)
+        revisions.update({url: resolve(title) for url, title in titles.items()})
+    return revisions
+
+def scrape_cache_stats():
+    return dict(article_cache.stats(), **revalidation_stats)
+
+def scrape_wikipedia(url):
+    """
+    Scrapes a Wikipedia article and returns a structured dictionary of content.
+    Synchronous wrapper around scrape_wikipedia_async for scripts and the CLI.
+    """
+    async def _run():
+        try:
+            return await scrape_wikipedia_async(url)
+        finally:
+            await close_http_client()
+
+    return asyncio.run(_run())
+
 if __name__ == "__main__":
     # Test scraping
     test_url = "https://en.wikipedia.org/wiki/Alan_Turing"
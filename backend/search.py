@@ -0,0 +1,122 @@
+import re
+from sqlalchemy import select, text, or_, and_, column, union_all, Float, Integer, String
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import WikiArticle, Quiz, Question, SEARCH_TEXT_CONFIG
+
+# Longest article summary returned with an article hit
+SEARCH_SUMMARY_CHARS = 300
+
+TERM = re.compile(r"\w+")
+
+class SearchUnavailable(Exception):
+    pass
+
+def fts5_query(query):
+    """
+    FTS5 MATCH expression for free text: every word must appear. Words are
+    quoted so punctuation and FTS5 operators in user input are not parsed.
+    """
+    return " ".join(f'"{term}"' for term in TERM.findall(query))
+
+def ranked_hits(dialect):
+    """
+    Subquery of (kind, id, score) for every article and question matching
+    :query, so the best matches win however old they are. Scoring reads
+    only the full-text index (and the indexed vector column on PostgreSQL);
+    titles and links are loaded for one page afterwards.
+    """
+    # Questions of a quiz still streaming (or abandoned mid-stream) never match
+    complete_questions = (
+        "SELECT q.id FROM questions q JOIN quizzes z ON z.id = q.quiz_id WHERE z.status = 'complete'"
+    )
+    if dialect == "postgresql":
+        tsquery = f"websearch_to_tsquery('{SEARCH_TEXT_CONFIG}', :query)"
+        rank = f"ts_rank(search_vector, {tsquery}, 32)"
+        branches = {
+            "article": f"SELECT 'article' AS kind, id, {rank} AS score "
+                       f"FROM articles WHERE search_vector @@ {tsquery}",
+            "question": f"SELECT 'question' AS kind, id, {rank} AS score "
+                        f"FROM questions WHERE search_vector @@ {tsquery} AND id IN ({complete_questions})",
+        }
+    elif dialect == "sqlite":
+        # bm25 is lower-is-better; negate it so both dialects sort descending
+        branches = {
+            "article": "SELECT 'article' AS kind, rowid AS id, -bm25(articles_fts, 4.0, 1.0) AS score "
+                       "FROM articles_fts WHERE articles_fts MATCH :query",
+            "question": "SELECT 'question' AS kind, rowid AS id, -bm25(questions_fts, 2.0, 1.0) AS score "
+                        f"FROM questions_fts WHERE questions_fts MATCH :query AND rowid IN ({complete_questions})",
+        }
+    else:
+        raise SearchUnavailable(f"Full-text search is not supported on {dialect}")
+    columns = (column("kind", String), column("id", Integer), column("score", Float))
+    return union_all(*(
+        text(sql).columns(*columns) for sql in branches.values()
+    )).subquery("hits")
+
+async def search(db: AsyncSession, query: str, limit: int, after=None):
+    """
+    One page of hits for query, best first, as dicts. `after` is the
+    (score, kind, id) of the previous page's last hit. Returns (items,
+    next_after), with next_after None on the last page.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        query = fts5_query(query)
+        if not query:
+            return [], None
+    hits = ranked_hits(dialect)
+    page = select(hits.c.kind, hits.c.id, hits.c.score)
+    if after:
+        score, kind, hit_id = after
+        page = page.where(or_(
+            hits.c.score < score,
+            and_(hits.c.score == score, hits.c.kind < kind),
+            and_(hits.c.score == score, hits.c.kind == kind, hits.c.id < hit_id)
+        ))
+    page = page.order_by(hits.c.score.desc(), hits.c.kind.desc(), hits.c.id.desc()).limit(limit + 1)
+    rows = (await db.execute(page, {"query": query})).all()
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = (rows[-1].score, rows[-1].kind, rows[-1].id)
+
+    article_ids = [row.id for row in rows if row.kind == "article"]
+    question_ids = [row.id for row in rows if row.kind == "question"]
+    articles = {}
+    if article_ids:
+        result = await db.execute(select(
+            WikiArticle.id, WikiArticle.title, WikiArticle.url, WikiArticle.summary
+        ).where(WikiArticle.id.in_(article_ids)))
+        articles = {row.id: row for row in result}
+    questions = {}
+    if question_ids:
+        result = await db.execute(select(
+            Question.id, Question.question_text, Quiz.article_id, WikiArticle.title, WikiArticle.url
+        ).join(Quiz, Question.quiz_id == Quiz.id).join(WikiArticle, Quiz.article_id == WikiArticle.id)
+         .where(Question.id.in_(question_ids), Quiz.status == "complete"))
+        questions = {row.id: row for row in result}
+
+    items = []
+    for row in rows:
+        if row.kind == "article" and row.id in articles:
+            article = articles[row.id]
+            items.append({
+                "type": "article",
+                "article_id": article.id,
+                "title": article.title,
+                "url": article.url,
+                "summary": (article.summary or "")[:SEARCH_SUMMARY_CHARS],
+                "score": row.score,
+            })
+        elif row.kind == "question" and row.id in questions:
+            question = questions[row.id]
+            items.append({
+                "type": "question",
+                "article_id": question.article_id,
+                "title": question.title,
+                "url": question.url,
+                "question_id": question.id,
+                "question": question.question_text,
+                "score": row.score,
+            })
+    return items, next_after
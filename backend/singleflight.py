@@ -0,0 +1,39 @@
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    Coalesces concurrent async calls that share a key: the first caller starts
+    the work, later callers await the same task and receive its result (or
+    exception). The key is forgotten as soon as the task finishes.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            self.started += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+            log.debug("Joining in-flight request for %s", key)
+        # Shield so one cancelled caller does not cancel the work for the rest
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    def __len__(self):
+        return len(self._calls)
+
+    def stats(self):
+        return {"in_flight": len(self._calls), "started": self.started, "coalesced": self.coalesced}
@@ -0,0 +1,328 @@
+import bz2
+import html
+import logging
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+import zstandard
+from sqlalchemy import insert, select
+from database import SessionLocal, WikiArticle
+from extractor import TEXT_BUDGET, LINK_LIMIT, SECTION_TEXT_BUDGET
+from observability import span
+from scraper import article_data
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional; fall back to the stdlib parser
+    import xml.etree.ElementTree as etree
+
+# Articles inserted per transaction, and raw pages handed to a parse worker at once
+DUMP_BATCH_SIZE = int(os.getenv("DUMP_BATCH_SIZE", "1000"))
+# Parse processes (1 parses in the loading process)
+DUMP_WORKERS = int(os.getenv("DUMP_WORKERS", "1"))
+
+DEFAULT_BASE = "https://en.wikipedia.org/wiki/"
+
+log = logging.getLogger(__name__)
+
+def open_dump(path):
+    """
+    Binary stream over a MediaWiki XML dump, decompressing .bz2 and .zst
+    on the fly. Nothing beyond the decompressor's window is buffered.
+    """
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith((".zst", ".zstd")):
+        # Dumps are often compressed with --long, which needs a large window
+        return zstandard.ZstdDecompressor(max_window_size=2 ** 31).stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+def _local(tag):
+    return tag.rpartition("}")[2]
+
+def iter_pages(stream):
+    """
+    Yields (url, title, wikitext, revision id) for every main-namespace, non-redirect page
+    in the dump. Each <page> is dropped from the tree once read, so memory
+    stays flat however large the dump is.
+    """
+    kwargs = {"huge_tree": True} if hasattr(etree, "LXML_VERSION") else {}
+    root = None
+    ns = ""
+    base = DEFAULT_BASE
+    for event, elem in etree.iterparse(stream, events=("start", "end"), **kwargs):
+        if event == "start":
+            if root is None:
+                root = elem
+                ns = elem.tag[:elem.tag.index("}") + 1] if elem.tag.startswith("{") else ""
+            continue
+        name = _local(elem.tag)
+        if name == "siteinfo":
+            site_base = elem.findtext(f"{ns}base")
+            if site_base:
+                base = site_base.rsplit("/", 1)[0] + "/"
+            root.clear()
+        elif name == "page":
+            if elem.findtext(f"{ns}ns") == "0" and elem.find(f"{ns}redirect") is None:
+                title = elem.findtext(f"{ns}title")
+                text = elem.findtext(f"{ns}revision/{ns}text") or ""
+                revision = elem.findtext(f"{ns}revision/{ns}id")
+                url = base + quote(title.replace(" ", "_"), safe="/:(),'!*$@;")
+                yield url, title, text, int(revision) if revision else None
+            root.clear()
+
+# -- wikitext -------------------------------------------------------------------
+
+COMMENT = re.compile(r"<!--.*?-->", re.S)
+REF = re.compile(r"<ref\b[^>]*/>|<ref\b[^>]*>.*?</ref\s*>", re.S | re.I)
+BLOCK_TAGS = re.compile(
+    r"<(gallery|math|chem|timeline|score|syntaxhighlight|source|pre|imagemap|mapframe|graph|templatedata)\b[^>]*>.*?</\1\s*>",
+    re.S | re.I,
+)
+# {{templates}} nest; tables open and close at the start of a line
+NESTED = re.compile(r"\{\{|\}\}|^\{\||^\|\}", re.M)
+LINK = re.compile(r"\[\[|\]\]")
+EXTERNAL_LINK = re.compile(r"\[(?:https?:)?//[^\s\]]+\s*([^\]]*)\]")
+TAG = re.compile(r"</?[a-zA-Z][^>]*>")
+FORMATTING = re.compile(r"'{2,}|__[A-Z]+__")
+HEADING = re.compile(r"^(={2,6})\s*(.+?)\s*\1\s*$")
+SPACES = re.compile(r"\s+")
+# Link prefixes whose target is not an article to show as text
+DROPPED_NAMESPACES = {"file", "image", "media", "category"}
+INTERWIKI = re.compile(r"^[a-z]{2,3}(?:-[a-z]+)?$")
+# Lines that are lists, tables, rules or indentation rather than prose
+NON_PROSE = ("*", "#", ":", ";", "|", "!", "{", "----")
+
+def _remove_nested(text):
+    out = []
+    depth = 0
+    last = 0
+    for m in NESTED.finditer(text):
+        if m.group() in ("{{", "{|"):
+            if depth == 0:
+                out.append(text[last:m.start()])
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                last = m.end()
+    if depth == 0:
+        out.append(text[last:])
+    return "".join(out)
+
+def _link_text(inner, links):
+    target, _, label = inner.partition("|")
+    target = target.strip()
+    prefix, colon, _ = target.lstrip(":").partition(":")
+    if colon and not target.startswith(":"):
+        prefix = prefix.strip().lower()
+        if prefix in DROPPED_NAMESPACES or INTERWIKI.match(prefix):
+            return ""
+    text = (label or target.lstrip(":").partition("#")[0]).strip()
+    if text and not target.startswith(":") and len(links) < LINK_LIMIT:
+        links.append(text)
+    return text
+
+def _replace_links(text, links):
+    out = []
+    depth = 0
+    last = 0
+    start = 0
+    for m in LINK.finditer(text):
+        if m.group() == "[[":
+            if depth == 0:
+                out.append(text[last:m.start()])
+                start = m.end()
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                out.append(_link_text(text[start:m.start()], links))
+                last = m.end()
+    out.append(text[last:] if depth == 0 else text[last:start - 2])
+    return "".join(out)
+
+class WikitextPage:
+    """
+    Title, summary, sections, text and links of one article, read from its
+    wikitext with the same budgets and grouping ArticleExtractor applies to
+    HTML: the first paragraph is the summary, level 2/3 headings are
+    sections, and prose paragraphs are grouped under their heading.
+    Templates, tables, references, files and lists are dropped.
+    """
+
+    def __init__(self, title, wikitext, text_budget=TEXT_BUDGET, section_budget=SECTION_TEXT_BUDGET):
+        self.title = title
+        self.summary = ""
+        self.sections = []
+        self.section_texts = []
+        self.links = []
+        self.text_budget = text_budget
+        self.section_budget = section_budget
+        self._text_parts = []
+        self._text_len = 0
+        self._section_len = 0
+        self._parse(wikitext)
+
+    @property
+    def full_text(self):
+        return "".join(self._text_parts)[:self.text_budget]
+
+    def _parse(self, wikitext):
+        text = COMMENT.sub("", wikitext)
+        text = REF.sub("", text)
+        text = BLOCK_TAGS.sub("", text)
+        text = _remove_nested(text)
+        text = _replace_links(text, self.links)
+        text = EXTERNAL_LINK.sub(r"\1", text)
+        text = TAG.sub("", text)
+        text = FORMATTING.sub("", text)
+
+        paragraph = []
+        for line in text.split("\n"):
+            line = line.strip()
+            heading = HEADING.match(line)
+            if heading or not line or line.startswith(NON_PROSE):
+                self._add_paragraph(paragraph)
+                paragraph = []
+                if heading and len(heading.group(1)) <= 3:
+                    self._add_heading(heading.group(2))
+                continue
+            paragraph.append(line)
+        self._add_paragraph(paragraph)
+
+    def _add_text(self, text):
+        if self._text_len < self.text_budget:
+            self._text_parts.append(text)
+            self._text_parts.append("\n\n")
+            self._text_len += len(text) + 2
+
+    def _add_heading(self, heading):
+        heading = SPACES.sub(" ", html.unescape(heading)).strip()
+        if not heading:
+            return
+        self.sections.append(heading)
+        self._add_text(heading)
+        if self._section_len < self.section_budget:
+            self.section_texts.append({"title": heading, "paragraphs": []})
+
+    def _add_paragraph(self, lines):
+        text = SPACES.sub(" ", html.unescape(" ".join(lines))).strip()
+        if not any(c.isalpha() for c in text):
+            return
+        if not self.summary:
+            self.summary = text
+        self._add_text(text)
+        if self._section_len < self.section_budget:
+            if not self.section_texts:
+                self.section_texts.append({"title": "Introduction", "paragraphs": []})
+            self.section_texts[-1]["paragraphs"].append(text)
+            self._section_len += len(text)
+
+def parse_page(url, title, wikitext, revision_id=None):
+    """
+    The scrape_wikipedia result dict for a dump page, or None when nothing
+    readable is left once markup is stripped. raw_html is None: dumps carry
+    wikitext, not rendered HTML.
+    """
+    page = WikitextPage(title, wikitext)
+    if not page.summary:
+        return None
+    return article_data(url, page, None, revision_id)
+
+# -- loading --------------------------------------------------------------------
+
+def _article_rows(pages):
+    """
+    Parse step run by the workers: stored columns only, so the text and
+    per-section paragraphs are not shipped back between processes. No
+    content_hash is stored: it would hash stripped wikitext, which never
+    equals the hash of a scrape's text, so refresh.py records its first
+    scrape as the baseline instead of reporting a change.
+    """
+    rows = []
+    for url, title, wikitext, revision_id in pages:
+        data = parse_page(url, title, wikitext, revision_id)
+        if data:
+            rows.append({key: data[key] for key in (
+                "url", "title", "summary", "sections", "key_entities", "revision_id"
+            )})
+    return rows
+
+def write_rows(rows):
+    """
+    Inserts article rows in one transaction, skipping URLs already stored
+    (so an interrupted import can be re-run). Returns the number inserted.
+    """
+    rows = list({row["url"]: row for row in rows}.values())
+    db = SessionLocal()
+    try:
+        existing = set(db.scalars(select(WikiArticle.url).where(WikiArticle.url.in_([r["url"] for r in rows]))))
+        fresh = [row for row in rows if row["url"] not in existing]
+        if fresh:
+            db.execute(insert(WikiArticle), fresh)
+        with span("db_commit", "dump_batch"):
+            db.commit()
+        return len(fresh)
+    finally:
+        db.close()
+
+def _batches(pages, size, limit=None):
+    batch = []
+    for n, page in enumerate(pages):
+        if limit is not None and n >= limit:
+            break
+        batch.append(page)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _parsed_batches(batches, workers):
+    """
+    Parses batches in order, in worker processes when workers > 1. At most
+    two batches per worker are in flight, which bounds memory: the dump is
+    read only as fast as the pages are parsed.
+    """
+    if workers <= 1:
+        for batch in batches:
+            yield len(batch), _article_rows(batch)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append((len(batch), pool.submit(_article_rows, batch)))
+            if len(pending) >= workers * 2:
+                size, future = pending.popleft()
+                yield size, future.result()
+        while pending:
+            size, future = pending.popleft()
+            yield size, future.result()
+
+def ingest_dump(path, batch_size=DUMP_BATCH_SIZE, workers=DUMP_WORKERS, limit=None):
+    """
+    Generator that streams the dump at path into the articles table. Yields
+    a progress dict after every committed batch and a summary dict (type
+    "summary") at the end. limit caps the number of pages read.
+    """
+    started = time.perf_counter()
+    counts = {"pages": 0, "parsed": 0, "inserted": 0}
+    with open_dump(path) as stream:
+        batches = _batches(iter_pages(stream), batch_size, limit)
+        for size, rows in _parsed_batches(batches, workers):
+            inserted = write_rows(rows) if rows else 0
+            counts["pages"] += size
+            counts["parsed"] += len(rows)
+            counts["inserted"] += inserted
+            elapsed = time.perf_counter() - started
+            yield dict(counts, type="progress", elapsed_seconds=round(elapsed, 2),
+                       pages_per_second=round(counts["pages"] / elapsed, 1) if elapsed else 0.0)
+    elapsed = time.perf_counter() - started
+    log.info("Dump import finished: %s", counts)
+    yield dict(counts, type="summary", skipped=counts["parsed"] - counts["inserted"],
+               elapsed_seconds=round(elapsed, 2),
+               pages_per_second=round(counts["pages"] / elapsed, 1) if elapsed else 0.0)
@@ -46,12 +46,20 @@ const LandingPage = () => (
 function App() {
     const [history, setHistory] = useState([]);
     const [loadingHistory, setLoadingHistory] = useState(false);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
+    const [historyFilter, setHistoryFilter] = useState('');
 
-    const fetchHistory = async () => {
+    // First page of history, optionally filtered by title prefix
+    const fetchHistory = async (titlePrefix = '') => {
         setLoadingHistory(true);
+        setHistoryFilter(titlePrefix);
         try {
-            const response = await axios.get(`${API_BASE}/quizzes`);
-            setHistory(response.data);
+            const response = await axios.get(`${API_BASE}/quizzes`, {
+                params: titlePrefix ? { title_prefix: titlePrefix } : {}
+            });
+            setHistory(response.data.items);
+            setNextCursor(response.data.next_cursor);
         } catch (error) {
             console.error('Error fetching history:', error);
         } finally {
@@ -59,6 +67,23 @@ function App() {
         }
     };
 
+    // Next page for the filter the current list was loaded with
+    const loadMoreHistory = async () => {
+        if (!nextCursor) return;
+        setLoadingMore(true);
+        try {
+            const params = { cursor: nextCursor };
+            if (historyFilter) params.title_prefix = historyFilter;
+            const response = await axios.get(`${API_BASE}/quizzes`, { params });
+            setHistory((items) => [...items, ...response.data.items]);
+            setNextCursor(response.data.next_cursor);
+        } catch (error) {
+            console.error('Error fetching more history:', error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     return (
         <Router>
             <div className="container">
@@ -84,6 +109,9 @@ function App() {
                                     loading={loadingHistory}
                                     apiBase={API_BASE}
                                     onRefresh={fetchHistory}
+                                    hasMore={Boolean(nextCursor)}
+                                    loadingMore={loadingMore}
+                                    onLoadMore={loadMoreHistory}
                                 />
                             </div>
                         }
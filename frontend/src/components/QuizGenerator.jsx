@@ -15,6 +15,9 @@ const QuizGenerator = ({ apiBase, onNavigateToHistory }) => {
     const [preview, setPreview] = useState(null);
     const [loadingPreview, setLoadingPreview] = useState(false);
 
+    // Background job progress
+    const [jobStatus, setJobStatus] = useState(null);
+
     // Debounce URL input for preview
     useEffect(() => {
         const fetchPreview = async () => {
@@ -39,6 +42,30 @@ const QuizGenerator = ({ apiBase, onNavigateToHistory }) => {
         return () => clearTimeout(timer);
     }, [url, apiBase]);
 
+    const stageLabels = {
+        queued: 'Waiting in queue...',
+        scraping: 'Reading the Wikipedia article...',
+        generating: 'Writing questions with AI...',
+        saving: 'Saving your quiz...'
+    };
+
+    // Follow a background job over Server-Sent Events until it finishes
+    const waitForJob = (job) => new Promise((resolve, reject) => {
+        const source = new EventSource(`${apiBase}${job.events_url}`);
+        source.addEventListener('status', (event) => {
+            const update = JSON.parse(event.data);
+            setJobStatus(update.status);
+            if (update.status === 'done' || update.status === 'failed') {
+                source.close();
+                resolve(update);
+            }
+        });
+        source.onerror = () => {
+            source.close();
+            reject(new Error('Lost connection to the generation progress stream'));
+        };
+    });
+
     const handleGenerate = async (e) => {
         e.preventDefault();
         if (!url) return;
@@ -51,7 +78,14 @@ const QuizGenerator = ({ apiBase, onNavigateToHistory }) => {
         setPreview(null); // Clear preview once generating
 
         try {
-            const response = await axios.post(`${apiBase}/generate-quiz?url=${encodeURIComponent(url)}`);
+            const queued = await axios.post(`${apiBase}/generate-quiz?url=${encodeURIComponent(url)}&background=true`);
+            setJobStatus(queued.data.status);
+            const job = await waitForJob(queued.data);
+            if (job.status === 'failed') {
+                setError(`Quiz generation failed: ${job.error}`);
+                return;
+            }
+            const response = await axios.get(`${apiBase}/quiz/${job.article_id}`);
             setQuizData(response.data);
             setShowInput(false); // Hide input once generated
         } catch (err) {
@@ -68,6 +102,7 @@ const QuizGenerator = ({ apiBase, onNavigateToHistory }) => {
             }
         } finally {
             setLoading(false);
+            setJobStatus(null);
         }
     };
 
@@ -157,6 +192,13 @@ const QuizGenerator = ({ apiBase, onNavigateToHistory }) => {
                         </button>
                     </form>
 
+                    {loading && jobStatus && (
+                        <div style={{ textAlign: 'center', padding: '1rem' }}>
+                            <Loader2 className="animate-spin" size={20} style={{ color: 'var(--primary)' }} />
+                            <span style={{ marginLeft: '8px', fontSize: '0.9rem', color: 'var(--text-muted)' }}>{stageLabels[jobStatus] || 'Working...'}</span>
+                        </div>
+                    )}
+
                     {/* Preview Selection */}
                     {loadingPreview && (
                         <div style={{ textAlign: 'center', padding: '1rem' }}>
@@ -2,9 +2,15 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { BookOpen, ExternalLink, Loader2, X, ChevronRight } from 'lucide-react';
 
-const QuizHistory = ({ history, loading, apiBase, onRefresh }) => {
+const QuizHistory = ({ history, loading, apiBase, onRefresh, hasMore, loadingMore, onLoadMore }) => {
     const [selectedQuiz, setSelectedQuiz] = useState(null);
     const [loadingDetails, setLoadingDetails] = useState(false);
+    const [titlePrefix, setTitlePrefix] = useState('');
+
+    const handleSearch = (e) => {
+        e.preventDefault();
+        onRefresh(titlePrefix.trim());
+    };
 
     // Fetch history on mount for the new tab redirect
     useEffect(() => {
@@ -46,10 +52,22 @@ const QuizHistory = ({ history, loading, apiBase, onRefresh }) => {
         <div className="quiz-history">
             <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginBottom: '1rem' }}>
                 <h2 style={{ margin: 0 }}>Processing History</h2>
-                <button onClick={onRefresh} className="tab-btn" style={{ background: 'rgba(255,255,255,0.05)' }}>
+                <button onClick={() => onRefresh(titlePrefix.trim())} className="tab-btn" style={{ background: 'rgba(255,255,255,0.05)' }}>
                     Refresh
                 </button>
             </div>
+            <form onSubmit={handleSearch} style={{ display: 'flex', gap: '0.5rem', marginBottom: '1rem' }}>
+                <input
+                    type="text"
+                    placeholder="Filter by title (starts with)..."
+                    value={titlePrefix}
+                    onChange={(e) => setTitlePrefix(e.target.value)}
+                    style={{ flex: 1 }}
+                />
+                <button type="submit" className="tab-btn" style={{ background: 'rgba(255,255,255,0.05)' }}>
+                    Search
+                </button>
+            </form>
             {loading ? (
                 <div style={{ textAlign: 'center', padding: '3rem' }}>
                     <Loader2 className="animate-spin" size={40} style={{ color: 'var(--primary)' }} />
@@ -68,6 +86,7 @@ const QuizHistory = ({ history, loading, apiBase, onRefresh }) => {
                             <tr>
                                 <th>Article Title</th>
                                 <th>URL</th>
+                                <th>Questions</th>
                                 <th>Generated On</th>
                                 <th style={{ textAlign: 'right' }}>Action</th>
                             </tr>
@@ -86,6 +105,7 @@ const QuizHistory = ({ history, loading, apiBase, onRefresh }) => {
                                             {item.url}
                                         </a>
                                     </td>
+                                    <td style={{ fontSize: '0.85rem' }}>{item.question_count}</td>
                                     <td style={{ fontSize: '0.85rem' }}>
                                         {new Date(item.created_at).toLocaleDateString()}
                                     </td>
@@ -102,6 +122,18 @@ const QuizHistory = ({ history, loading, apiBase, onRefresh }) => {
                             ))}
                         </tbody>
                     </table>
+                    {hasMore && (
+                        <div style={{ textAlign: 'center', padding: '1rem' }}>
+                            <button
+                                className="tab-btn"
+                                style={{ background: 'rgba(255,255,255,0.05)' }}
+                                disabled={loadingMore}
+                                onClick={onLoadMore}
+                            >
+                                {loadingMore ? 'Loading...' : 'Load more'}
+                            </button>
+                        </div>
+                    )}
                 </div>
             )}
 